@@ -0,0 +1,176 @@
+"""
+centrality.py
+-------------
+Betweenness centrality for the service dependency graph, cached per topology
+version.
+
+Centrality only depends on the edges, so a telemetry update never triggers a
+recomputation. Exact Brandes is O(N·E); above ``EXACT_BETWEENNESS_MAX_NODES``
+services a k-pivot sampled approximation with a fixed seed is used instead, so
+results stay reproducible between runs.
+"""
+
+import os
+import random
+
+# ---------------------------------------------------------------------------
+# Constants
+# ---------------------------------------------------------------------------
+
+# Largest graph for which exact betweenness is computed
+EXACT_BETWEENNESS_MAX_NODES = int(os.environ.get("KAIROS_EXACT_BETWEENNESS_MAX_NODES", "1000"))
+
+# Number of sampled source pivots for the approximation
+APPROX_BETWEENNESS_PIVOTS = int(os.environ.get("KAIROS_BETWEENNESS_PIVOTS", "256"))
+
+# Seed for pivot sampling, so approximate scores are reproducible
+APPROX_BETWEENNESS_SEED = 42
+
+
+# ---------------------------------------------------------------------------
+# Helper — Brandes accumulation over the CSR adjacency
+# ---------------------------------------------------------------------------
+
+def _brandes(successors: list, sources) -> list:
+    """Unnormalized betweenness accumulated from the given source nodes."""
+    node_count = len(successors)
+    betweenness = [0.0] * node_count
+
+    for source in sources:
+        order = []
+        preds = [[] for _ in range(node_count)]
+        sigma = [0] * node_count
+        dist = [-1] * node_count
+        sigma[source] = 1
+        dist[source] = 0
+        queue = [source]
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            order.append(node)
+            next_dist = dist[node] + 1
+            for child in successors[node]:
+                if dist[child] < 0:
+                    dist[child] = next_dist
+                    queue.append(child)
+                if dist[child] == next_dist:
+                    sigma[child] += sigma[node]
+                    preds[child].append(node)
+
+        delta = [0.0] * node_count
+        for node in reversed(order):
+            coeff = (1.0 + delta[node]) / sigma[node]
+            for pred in preds[node]:
+                delta[pred] += sigma[pred] * coeff
+            if node != source:
+                betweenness[node] += delta[node]
+
+    return betweenness
+
+
+def betweenness_centrality(
+    topology,
+    exact_max_nodes: int = EXACT_BETWEENNESS_MAX_NODES,
+    pivots: int = APPROX_BETWEENNESS_PIVOTS,
+    seed: int = APPROX_BETWEENNESS_SEED,
+) -> list:
+    """
+    Exact betweenness for small graphs, k-pivot sampled approximation otherwise.
+
+    Scores are normalized the same way as ``nx.betweenness_centrality`` for
+    directed graphs.
+
+    Returns:
+        list: Normalized betweenness centrality, indexed by service id.
+    """
+    node_count = len(topology)
+    successors = topology.successor_lists()
+
+    if node_count <= exact_max_nodes or pivots >= node_count:
+        sources = range(node_count)
+        sampled_pivots = None
+    else:
+        sources = random.Random(seed).sample(range(node_count), pivots)
+        sampled_pivots = pivots
+
+    betweenness = _brandes(successors, sources)
+    scale = _normalization(node_count, sampled_pivots)
+    return [value * scale for value in betweenness]
+
+
+def _normalization(node_count: int, sampled_pivots: int | None = None, sampled_from: int | None = None) -> float:
+    """
+    Factor turning raw (optionally pivot-sampled) betweenness into normalized
+    scores. `sampled_from` is the node count the pivots were drawn from, if it
+    differs from `node_count`.
+    """
+    if node_count <= 2:
+        return 1.0
+    if sampled_pivots is None:
+        sample_scale = 1.0
+    else:
+        sample_scale = (sampled_from if sampled_from is not None else node_count) / sampled_pivots
+    return sample_scale / ((node_count - 1) * (node_count - 2))
+
+
+class CentralityCache:
+    """Holds the centrality scores computed for the current topology version."""
+
+    def __init__(
+        self,
+        exact_max_nodes: int = EXACT_BETWEENNESS_MAX_NODES,
+        pivots: int = APPROX_BETWEENNESS_PIVOTS,
+        seed: int = APPROX_BETWEENNESS_SEED,
+    ):
+        self.exact_max_nodes = exact_max_nodes
+        self.pivots = pivots
+        self.seed = seed
+        self._version = None
+        self._scores = []
+        self._node_count = 0
+        self._sampled_pivots = None
+        self._sampled_from = 0
+
+    def get(self, topology) -> list:
+        """Return centrality scores, recomputing only if the topology version changed."""
+        if topology.version != self._version:
+            node_count = len(topology)
+            self._scores = betweenness_centrality(
+                topology, self.exact_max_nodes, self.pivots, self.seed
+            )
+            self._version = topology.version
+            self._node_count = node_count
+            exact = node_count <= self.exact_max_nodes or self.pivots >= node_count
+            self._sampled_pivots = None if exact else self.pivots
+            self._sampled_from = node_count
+        return self._scores
+
+    def extend(self, previous, topology) -> list:
+        """
+        Scores for `topology`, which is `previous` plus isolated services.
+
+        An isolated service lies on no shortest path, so existing raw scores
+        are unchanged and the new ones are 0; only the normalization constant
+        moves. Sampled pivots were drawn from the original nodes, so the sample
+        scale stays tied to that count. Falls back to `get` if `previous` is
+        not the cached topology.
+        """
+        if previous.version != self._version:
+            return self.get(topology)
+        self._scores = self._extended(len(topology))
+        self._version = topology.version
+        self._node_count = len(topology)
+        return self._scores
+
+    def extended(self, previous, topology) -> list:
+        """Like `extend`, but leaves the cache on `previous`."""
+        if previous.version != self._version:
+            return betweenness_centrality(topology, self.exact_max_nodes, self.pivots, self.seed)
+        return self._extended(len(topology))
+
+    def _extended(self, node_count: int) -> list:
+        factor = _normalization(node_count, self._sampled_pivots, self._sampled_from) / _normalization(
+            self._node_count, self._sampled_pivots, self._sampled_from
+        )
+        return [value * factor for value in self._scores] + [0.0] * (node_count - self._node_count)
@@ -0,0 +1,202 @@
+"""
+environments.py
+---------------
+Isolated per-environment state (prod regions, staging, tenants) so one
+process can model many clusters without their telemetry colliding.
+
+Each EnvironmentState owns its telemetry, graph model and incident timeline
+events. The EnvironmentRegistry hands them out by name, keeps them in LRU
+order and evicts idle environments once the configured count, memory or idle
+limits are exceeded. The default environment wraps the module-level state in
+graph_engine.py and is never evicted.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from app.engines.graph_engine import (
+    DEFAULT_ENVIRONMENT,
+    ServiceGraphModel,
+    _default_telemetry,
+    _global_telemetry,
+    _graph_model,
+)
+from app.engines.topology import topology_loader
+
+# ---------------------------------------------------------------------------
+# Constants
+# ---------------------------------------------------------------------------
+
+# Maximum number of environments kept in memory (including the default one)
+MAX_ENVIRONMENTS = int(os.environ.get("KAIROS_MAX_ENVIRONMENTS", "32"))
+
+# Memory budget across all environments
+MAX_ENVIRONMENT_BYTES = int(os.environ.get("KAIROS_MAX_ENVIRONMENT_MB", "512")) * 1024 * 1024
+
+# Environments untouched for this long are evicted (0 disables the check)
+ENVIRONMENT_IDLE_SECONDS = float(os.environ.get("KAIROS_ENVIRONMENT_IDLE_SECONDS", "3600"))
+
+# Demo events every new environment's timeline starts with
+SAMPLE_TELEMETRY_EVENTS = [
+    {"timestamp": "2026-02-21T12:03:00", "service": "Payment Gateway", "metric": "latency", "value": 1500, "threshold": 800},
+    {"timestamp": "2026-02-21T12:07:00", "service": "Auth Service", "metric": "retry_rate", "value": 0.4, "threshold": 0.2},
+    {"timestamp": "2026-02-21T12:12:00", "service": "Frontend", "metric": "error_rate", "value": 0.15, "threshold": 0.05},
+    {"timestamp": "2026-02-21T12:25:00", "service": "Database", "metric": "cpu_usage", "value": 0.95, "threshold": 0.8},
+]
+
+
+# ---------------------------------------------------------------------------
+# Per-environment state
+# ---------------------------------------------------------------------------
+
+class EnvironmentState:
+    """Telemetry, graph model and timeline events of one environment."""
+
+    def __init__(self, name: str, graph_model=None, telemetry=None):
+        self.name = name
+        telemetry = telemetry if telemetry is not None else _default_telemetry()
+        self.graph_model = graph_model or ServiceGraphModel(
+            telemetry=telemetry, loader=topology_loader(name)
+        )
+        # Written by the graph model under its publish lock
+        self.telemetry = self.graph_model.telemetry
+        self.events = list(SAMPLE_TELEMETRY_EVENTS)
+        self.last_used = time.monotonic()
+        self.nbytes = 0
+        self._measured_version = None
+        self.measure()
+
+    def measure(self) -> int:
+        """
+        Refresh and return the approximate memory held by this environment.
+        Called after a publish or topology reload; a no-op if the graph
+        version has not moved since the last measurement.
+        """
+        version = self.graph_model.snapshot().version
+        if version == self._measured_version:
+            return self.nbytes
+        self._measured_version = version
+        self.nbytes = (
+            self.graph_model.nbytes()
+            + sys.getsizeof(self.telemetry)
+            + sum(sys.getsizeof(metrics) for metrics in self.telemetry.values())
+            + sys.getsizeof(self.events)
+            + sum(sys.getsizeof(event) for event in self.events)
+        )
+        return self.nbytes
+
+
+# ---------------------------------------------------------------------------
+# Registry
+# ---------------------------------------------------------------------------
+
+class EnvironmentRegistry:
+    """LRU registry of EnvironmentState objects keyed by environment name."""
+
+    def __init__(
+        self,
+        max_environments: int = MAX_ENVIRONMENTS,
+        max_bytes: int = MAX_ENVIRONMENT_BYTES,
+        idle_seconds: float = ENVIRONMENT_IDLE_SECONDS,
+        default_state: EnvironmentState | None = None,
+    ):
+        self.max_environments = max_environments
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._states = OrderedDict()
+        # Per-name locks held while an environment is being built
+        self._creating = {}
+        self._states[DEFAULT_ENVIRONMENT] = default_state or EnvironmentState(DEFAULT_ENVIRONMENT)
+
+    def get(self, name: str = DEFAULT_ENVIRONMENT) -> EnvironmentState:
+        """
+        Return the named environment, creating it (and evicting others) if needed.
+
+        Raises:
+            KeyError: If the environment has a per-environment topology
+                source ("{env}" in KAIROS_TOPOLOGY_PATH) that does not exist.
+        """
+        with self._lock:
+            state = self._states.get(name)
+            if state is not None:
+                return self._touch(name, state)
+            creating = self._creating.setdefault(name, threading.Lock())
+
+        # Loading the topology and building the indexes can take seconds on a
+        # large graph, so only callers of this one environment wait for it
+        with creating:
+            with self._lock:
+                state = self._states.get(name)
+            if state is None:
+                try:
+                    state = EnvironmentState(name)
+                except FileNotFoundError as exc:
+                    with self._lock:
+                        self._creating.pop(name, None)
+                    raise KeyError(f"Unknown environment {name!r}: no topology at {exc.filename}") from exc
+            with self._lock:
+                state = self._states.setdefault(name, state)
+                if self._creating.get(name) is creating:
+                    del self._creating[name]
+                return self._touch(name, state)
+
+    def _touch(self, name: str, state: EnvironmentState) -> EnvironmentState:
+        # Caller holds self._lock
+        self._states.move_to_end(name)
+        state.last_used = time.monotonic()
+        self._evict(keep=name)
+        return state
+
+    def _evict(self, keep: str):
+        # Sizes are the ones cached by EnvironmentState.measure after each publish
+        now = time.monotonic()
+        total_bytes = sum(state.nbytes for state in self._states.values())
+        for name in list(self._states):
+            if name in (keep, DEFAULT_ENVIRONMENT):
+                continue
+            state = self._states[name]
+            over_count = len(self._states) > self.max_environments
+            over_memory = total_bytes > self.max_bytes
+            idle = self.idle_seconds > 0 and now - state.last_used > self.idle_seconds
+            if not (over_count or over_memory or idle):
+                continue
+            del self._states[name]
+            total_bytes -= state.nbytes
+            self.evictions += 1
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._states
+
+    def stats(self) -> dict:
+        """Memory and idle-time accounting for every live environment."""
+        now = time.monotonic()
+        with self._lock:
+            environments = [
+                {
+                    "name": state.name,
+                    "services": len(state.graph_model.topology),
+                    "bytes": state.nbytes,
+                    "idle_seconds": round(now - state.last_used, 1),
+                }
+                for state in self._states.values()
+            ]
+        return {
+            "environments": environments,
+            "total_bytes": sum(env["bytes"] for env in environments),
+            "max_bytes": self.max_bytes,
+            "max_environments": self.max_environments,
+            "evictions": self.evictions,
+        }
+
+
+# Process-wide registry; the default environment shares graph_engine's module state
+environments = EnvironmentRegistry(
+    default_state=EnvironmentState(
+        DEFAULT_ENVIRONMENT, graph_model=_graph_model, telemetry=_global_telemetry
+    )
+)
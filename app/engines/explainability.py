@@ -1,48 +1,148 @@
+import os
+import threading
+import time
+
 import numpy as np
-import pandas as pd
-import shap
-from app.engines.ml_model import train_model, predict_service_probability, FEATURE_COLUMNS
-
-
-def generate_explainability(service_name: str, features: dict, confidence: int = None):
-    """Generate feature importance using SHAP TreeExplainer (optimized for XGBoost)."""
-    model = train_model()
-
-    # Normalize and cap features to stay within expected training ranges
-    capped_features = {
-        'error_rate': min(1.0, max(0.0, float(features.get('error_rate', 0)))),
-        'latency': min(5000.0, max(0.0, float(features.get('latency', 0)))),
-        'cpu_usage': min(100.0, max(0.0, float(features.get('cpu_usage', 0)))),
-        'downstream_failures': min(10.0, max(0.0, float(features.get('downstream_failures', 0)))),
-        'impact_score': min(1.0, max(0.0, float(features.get('impact_score', 0))))
-    }
+import xgboost
+from app.engines.inference import FEATURE_COLUMNS, feature_matrix
+from app.engines.ml_model import current_model, explanation_cache, predict_service_probabilities
 
-    input_df = pd.DataFrame([capped_features])[FEATURE_COLUMNS]
-    
-    # Use provided confidence or calculate prob from model
-    if confidence is not None:
-        prob = confidence / 100.0
-    else:
-        prob = predict_service_probability(features)
+# "shap" (shap.TreeExplainer) or "xgboost" (Booster pred_contribs, exact
+# TreeSHAP without importing shap)
+EXPLANATION_BACKEND = os.environ.get("KAIROS_EXPLANATION_BACKEND", "shap")
+
+# Hypotheses explained per /incident/analyze request
+EXPLAINED_HYPOTHESES = int(os.environ.get("KAIROS_EXPLAINED_HYPOTHESES", "3"))
 
-    # Use SHAP TreeExplainer (fast for tree models)
-    explainer = shap.TreeExplainer(model)
-    shap_values = explainer.shap_values(input_df)
+# Interaction mode: most rows and predicted seconds spent per request, and
+# feature pairs reported per service
+INTERACTION_MAX_ROWS = int(os.environ.get("KAIROS_INTERACTION_MAX_ROWS", "8"))
+INTERACTION_BUDGET_SECONDS = float(os.environ.get("KAIROS_INTERACTION_BUDGET_SECONDS", "0.25"))
+INTERACTION_TOP_PAIRS = 3
 
-    # Resolve SHAP value structure based on output format
+DISPLAY_NAMES = ['Error Rate', 'Latency', 'CPU Usage', 'Downstream Failures', 'Impact Score']
+THRESHOLDS = {'error_rate': 0.05, 'latency': 400, 'cpu_usage': 70, 'downstream_failures': 2, 'impact_score': 0.1}
+THRESHOLD_VECTOR = np.array([THRESHOLDS[column] for column in FEATURE_COLUMNS])
+
+
+def _positive_class_shap(shap_values, rows: int) -> np.ndarray:
+    """Resolve the explainer's output to a ``(rows, len(FEATURE_COLUMNS))`` array."""
     if isinstance(shap_values, list):
         # Binary case often returns a list [neg_class_shap, pos_class_shap]
-        sv = shap_values[1][0] if len(shap_values) > 1 else shap_values[0][0]
-    else:
-        # Some versions return specialized object or single array
-        if hasattr(shap_values, "values"):
-            sv = shap_values.values[0]
-        else:
-            sv = shap_values[0]
+        shap_values = shap_values[1] if len(shap_values) > 1 else shap_values[0]
+    elif hasattr(shap_values, "values"):
+        # Some versions return specialized object
+        shap_values = shap_values.values
+    return np.asarray(shap_values).reshape(rows, len(FEATURE_COLUMNS))
+
+
+def shap_rows(serving, X: np.ndarray) -> np.ndarray:
+    """Positive-class SHAP values of every row of `X` from the configured backend."""
+    if EXPLANATION_BACKEND == "xgboost":
+        dmatrix = xgboost.DMatrix(X, feature_names=serving.booster.feature_names)
+        # The last column is the bias term (the explainer's expected value)
+        return serving.booster.predict(dmatrix, pred_contribs=True)[:, :-1]
+    return _positive_class_shap(serving.explainer.shap_values(X), len(X))
+
+
+def interaction_rows(serving, X: np.ndarray) -> np.ndarray:
+    """``(rows, features, features)`` SHAP interaction values from the configured backend."""
+    if EXPLANATION_BACKEND == "xgboost":
+        dmatrix = xgboost.DMatrix(X, feature_names=serving.booster.feature_names)
+        # Drop the bias row and column
+        return serving.booster.predict(dmatrix, pred_interactions=True)[:, :-1, :-1]
+    values = serving.explainer.shap_interaction_values(X)
+    if isinstance(values, list):
+        values = values[1] if len(values) > 1 else values[0]
+    return np.asarray(values).reshape(len(X), len(FEATURE_COLUMNS), len(FEATURE_COLUMNS))
+
+
+class InteractionBudget:
+    """
+    Admits an interaction request only if it fits the size and time budget.
+    The time is predicted from the measured cost per row of earlier requests
+    on the same model, so an over-budget request is never started.
+    """
+
+    def __init__(self, seconds: float = INTERACTION_BUDGET_SECONDS, max_rows: int = INTERACTION_MAX_ROWS):
+        self.seconds = seconds
+        self.max_rows = max_rows
+        self.generation = None
+        self.seconds_per_row = None
+        self.computed = 0
+        self.fallbacks = 0
+        self._lock = threading.Lock()
+
+    def admits(self, generation: int, rows: int) -> bool:
+        with self._lock:
+            if generation != self.generation:
+                # Another model, another cost per row
+                self.generation = generation
+                self.seconds_per_row = None
+            fits = rows <= self.max_rows and (
+                self.seconds_per_row is None or self.seconds_per_row * rows <= self.seconds
+            )
+            if fits:
+                self.computed += 1
+            else:
+                self.fallbacks += 1
+            return fits
+
+    def record(self, generation: int, rows: int, seconds: float):
+        with self._lock:
+            if generation != self.generation:
+                return
+            per_row = seconds / max(rows, 1)
+            previous = self.seconds_per_row
+            self.seconds_per_row = per_row if previous is None else 0.8 * previous + 0.2 * per_row
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "budget_seconds": self.seconds,
+                "max_rows": self.max_rows,
+                "seconds_per_row": self.seconds_per_row,
+                "computed": self.computed,
+                "fallbacks": self.fallbacks,
+            }
+
 
+interaction_budget = InteractionBudget()
+
+
+def _top_interactions(values: np.ndarray) -> list:
+    """Strongest feature pairs of one service's interaction matrix."""
+    rows, columns = np.triu_indices(len(FEATURE_COLUMNS), k=1)
+    # The matrix is symmetric; a pair's total effect is split over both halves
+    pair_values = values[rows, columns] * 2.0
+    order = np.argsort(-np.abs(pair_values), kind="stable")[:INTERACTION_TOP_PAIRS]
+    return [
+        {
+            "features": [DISPLAY_NAMES[rows[k]], DISPLAY_NAMES[columns[k]]],
+            "interaction_value": float(pair_values[k]),
+            "effect": "reinforcing" if pair_values[k] > 0 else "offsetting",
+        }
+        for k in order.tolist()
+    ]
+
+
+def _interactions(serving, X: np.ndarray):
+    """Top feature pairs per row of `X`, or None if the budget does not allow it."""
+    if not interaction_budget.admits(serving.generation, len(X)):
+        return None
+    if EXPLANATION_BACKEND != "xgboost":
+        serving.explainer  # built outside the timed section
+    start = time.perf_counter()
+    values = interaction_rows(serving, X)
+    interaction_budget.record(serving.generation, len(X), time.perf_counter() - start)
+    return [_top_interactions(row) for row in values]
+
+
+def _explanation(service_name: str, features: dict, x: np.ndarray, sv: np.ndarray, prob: float) -> dict:
+    """Feature importance and summary for one service from its capped row `x` and SHAP row `sv`."""
     feature_names = FEATURE_COLUMNS
-    display_names = ['Error Rate', 'Latency', 'CPU Usage', 'Downstream Failures', 'Impact Score']
-    thresholds = {'error_rate': 0.05, 'latency': 400, 'cpu_usage': 70, 'downstream_failures': 2, 'impact_score': 0.1}
+    display_names = DISPLAY_NAMES
+    thresholds = THRESHOLDS
 
     # Normalize SHAP values to relative impact percentages with native casting
     # We prioritize positive contributors (drivers) over negative ones (noise/stabilizers)
@@ -63,7 +163,8 @@ def generate_explainability(service_name: str, features: dict, confidence: int =
         total_adj_val = total_adj.item() if hasattr(total_adj, 'item') else float(total_adj)
         
         impact_percent = (adj_val / total_adj_val) * 100
-        direction = "positive" if features.get(feat, 0) >= thresholds.get(feat, 0) else "negative"
+        # Capped value, so direction agrees with the cache key's threshold sides
+        direction = "positive" if x[i] >= thresholds.get(feat, 0) else "negative"
         
         raw_shap = sv[i].item() if hasattr(sv[i], 'item') else float(sv[i])
         
@@ -101,6 +202,70 @@ def generate_explainability(service_name: str, features: dict, confidence: int =
     }
 
 
+def generate_explanations(service_names: list, features: list, confidences: list = None,
+                          interactions: bool = False) -> list:
+    """
+    Explain several services with one vectorized SHAP call on their stacked
+    feature rows. Returns one `generate_explainability` result per service;
+    results served from the explanation cache are shared and read-only.
+
+    With `interactions`, each result also lists its strongest feature-pair
+    interactions, or None with ``interaction_mode`` "main_effects" when the
+    request is over the interaction budget.
+    """
+    if not service_names:
+        return []
+    # One explainer per loaded model version, rebuilt only when a retrain installs a new model
+    serving = current_model()
+
+    # Same capping table as prediction, written into the thread's feature buffer
+    X = feature_matrix(features)
+
+    results = [None] * len(service_names)
+    missing = list(range(len(service_names)))
+    if explanation_cache.enabled:
+        keys = explanation_cache.keys(
+            serving.generation, service_names, X, confidences, interactions, thresholds=THRESHOLD_VECTOR
+        )
+        results, missing = explanation_cache.lookup(keys)
+        if not missing:
+            return results
+
+    # Fancy indexing copies the rows out of the buffer, which scoring reuses
+    X = X[missing]
+    missed_features = [features[i] for i in missing]
+
+    # Use provided confidences or calculate probs from the model
+    if confidences is not None:
+        probs = [confidences[i] / 100.0 for i in missing]
+    else:
+        probs = predict_service_probabilities(missed_features).tolist()
+
+    # TreeSHAP values for every missing row at once
+    values = shap_rows(serving, X)
+    pairs = _interactions(serving, X) if interactions else None
+
+    explained = [
+        _explanation(service_names[i], service_features, x, sv, prob)
+        for i, service_features, x, sv, prob in zip(missing, missed_features, X, values, probs)
+    ]
+    for row, (i, explanation) in enumerate(zip(missing, explained)):
+        if interactions:
+            explanation["interaction_mode"] = "main_effects" if pairs is None else "pairs"
+            explanation["interactions"] = None if pairs is None else pairs[row]
+        results[i] = explanation
+    # Budget fallbacks are not cached, so a later request can still get its pairs
+    if explanation_cache.enabled and (not interactions or pairs is not None):
+        explanation_cache.store([keys[i] for i in missing], explained)
+    return results
+
+
+def generate_explainability(service_name: str, features: dict, confidence: int = None, interactions: bool = False):
+    """Generate feature importance using TreeSHAP (shap.TreeExplainer or XGBoost pred_contribs)."""
+    confidences = None if confidence is None else [confidence]
+    return generate_explanations([service_name], [features], confidences, interactions)[0]
+
+
 if __name__ == "__main__":
     test_input = {
         "error_rate": 0.7,
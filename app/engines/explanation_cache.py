@@ -0,0 +1,74 @@
+"""
+explanation_cache.py
+--------------------
+Memoizes full explanation payloads per service.
+
+During an incident the dashboard re-requests analysis every few seconds with
+the same suspects and the same telemetry, and each request would otherwise
+recompute the SHAP values and re-render the summary. Payloads are keyed on
+(model generation, service name, quantized capped feature vector, side of
+each feature's direction threshold, confidence) and kept in a bounded LRU
+with a TTL. A newly installed model starts with an empty cache.
+
+Services whose features fall in the same quantization bucket share one
+payload, so the summary quotes the raw values of the request that filled it.
+Cached payloads are shared between requests and must not be modified.
+"""
+
+import os
+
+import numpy as np
+
+from app.engines.prediction_cache import PREDICTION_CACHE_QUANTUM, PredictionCache, quantized_keys
+
+# ---------------------------------------------------------------------------
+# Constants
+# ---------------------------------------------------------------------------
+
+# Maximum cached explanations (0 disables the cache)
+EXPLANATION_CACHE_SIZE = int(os.environ.get("KAIROS_EXPLANATION_CACHE_SIZE", "1000"))
+
+# Seconds a cached explanation stays valid
+EXPLANATION_CACHE_TTL_SECONDS = float(os.environ.get("KAIROS_EXPLANATION_CACHE_TTL_SECONDS", "300"))
+
+
+# ---------------------------------------------------------------------------
+# Cache
+# ---------------------------------------------------------------------------
+
+class ExplanationCache(PredictionCache):
+    """
+    Thread-safe LRU + TTL map from (model generation, service, row key,
+    threshold sides, confidence, interaction mode) to an explanation payload.
+    """
+
+    def __init__(self, max_entries: int = EXPLANATION_CACHE_SIZE,
+                 ttl_seconds: float = EXPLANATION_CACHE_TTL_SECONDS,
+                 quantum: float = PREDICTION_CACHE_QUANTUM):
+        super().__init__(max_entries, ttl_seconds, quantum)
+
+    def keys(self, generation: int, service_names: list, X: np.ndarray, confidences: list | None = None,
+             interactions: bool = False, thresholds: np.ndarray | None = None) -> list:
+        """
+        One key per row of capped `X`. With `thresholds`, the key also records
+        which side of each feature's threshold the row is on, since rows that
+        share a quantization bucket can straddle a threshold.
+        """
+        confidences = confidences if confidences is not None else [None] * len(service_names)
+        if thresholds is None:
+            sides = [None] * len(service_names)
+        else:
+            sides = [row.tobytes() for row in np.packbits(X >= thresholds, axis=1)]
+        return [
+            (generation, service_name, row_key, side, confidence, interactions)
+            for service_name, row_key, side, confidence
+            in zip(service_names, quantized_keys(X, self.quantum), sides, confidences)
+        ]
+
+    # Payloads are stored as they are, and a miss is None
+
+    def _missing_values(self, count: int) -> list:
+        return [None] * count
+
+    def _entry_value(self, payload):
+        return payload
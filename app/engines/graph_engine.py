@@ -1,6 +1,27 @@
+import hashlib
+import threading
+import uuid
+
 import networkx as nx
+import numpy as np
+
+from app.engines.centrality import CentralityCache
+from app.engines.impact_engine import ImpactEngine
+from app.engines.reachability import ReachabilityIndex
+from app.engines.topology import Topology, topology_loader
+
+# Built-in service dependency edges (caller -> callee), used when no
+# KAIROS_TOPOLOGY_PATH file or registry is configured
+DEPENDENCY_EDGES = [
+    ("frontend", "auth-service"),
+    ("auth-service", "payment-service"),
+    ("payment-service", "database"),
+]
 
-# Global state to persist telemetry changes during scenarios
+# Environment served when a request does not name one
+DEFAULT_ENVIRONMENT = "default"
+
+# Global state of the default environment, persisting telemetry during scenarios
 _global_telemetry = {
     "frontend": {"error_rate": 0.01, "latency": 50, "cpu_usage": 30, "downstream_failures": 0},
     "auth-service": {"error_rate": 0.01, "latency": 80, "cpu_usage": 40, "downstream_failures": 0},
@@ -9,50 +30,344 @@ _global_telemetry = {
 }
 
 
-def build_graph():
+class GraphSnapshot:
     """
-    Build a directed graph representing service dependencies.
+    Immutable view of one environment's graph at a single version.
 
-    Returns:
-        nx.DiGraph: A directed graph with service dependency edges.
+    Holds the CSR topology (see topology.py), its topology-derived indexes and
+    the read-only telemetry/impact vectors of an ImpactEngine. Every request
+    that needs consistent results reads from one snapshot and never observes
+    a half-applied update.
     """
-    graph = nx.DiGraph()
 
-    # Add edges representing service dependencies
-    edges = [
-        ("frontend", "auth-service"),
-        ("auth-service", "payment-service"),
-        ("payment-service", "database"),
-    ]
+    def __init__(self, instance, version, topology_changed_at, topology, reachability,
+                 centrality, impact_engine, node_versions):
+        self._instance = instance
+        self.version = version
+        self.topology_changed_at = topology_changed_at
+        self.topology = topology
+        self.topology_version = topology.version
+        self.reachability = reachability
+        self.blast_radius = impact_engine.blast_radius
+        self.centrality = centrality
+        self.impact_engine = impact_engine
+        self.node_versions = node_versions
+        self.node_versions.flags.writeable = False
+        self._json = None
+        self._fleet_signals = None
+
+    @property
+    def etag(self) -> str:
+        """Strong ETag identifying this graph/telemetry version."""
+        return f'"{self._instance}-{self.version}"'
+
+    def etag_for(self, **query) -> str:
+        """
+        ETag of one representation of this version: the full graph when every
+        query parameter is None, otherwise a filtered or delta view of it.
+        """
+        params = sorted((name, value) for name, value in query.items() if value is not None)
+        if not params:
+            return self.etag
+        digest = hashlib.sha1(repr(params).encode()).hexdigest()[:12]
+        return f'"{self._instance}-{self.version}-{digest}"'
+
+    def needs_full(self, since: int) -> bool:
+        """True if a delta since `since` cannot be applied: the topology changed or `since` is unknown."""
+        return since < self.topology_changed_at or since > self.version
+
+    @property
+    def services(self) -> list:
+        return self.topology.services
+
+    def impact_scores(self) -> dict:
+        """Impact score of every service."""
+        return dict(zip(self.topology.services, self.impact_engine.impact.tolist()))
+
+    def fleet_signals(self) -> tuple:
+        """
+        Blast-radius-weighted error and downstream failure propagation of
+        every service, each computed in one vectorized pass per snapshot.
+        """
+        if self._fleet_signals is None:
+            engine = self.impact_engine
+            self._fleet_signals = (
+                engine.blast_weighted_error().tolist(),
+                engine.downstream_failure_propagation().tolist(),
+            )
+        return self._fleet_signals
+
+    def node_data(self, node: int) -> dict:
+        """Telemetry plus graph-derived attributes for one service id."""
+        blast_weighted, propagation = self.fleet_signals()
+        data = self.impact_engine.node_metrics(node)
+        data["blast_radius"] = int(self.blast_radius[node])
+        data["centrality"] = self.centrality[node]
+        data["impact_score"] = float(self.impact_engine.impact[node])
+        data["blast_weighted_error"] = blast_weighted[node]
+        data["downstream_failure_propagation"] = propagation[node]
+        return data
+
+    def descendants(self, service: str) -> list:
+        """Services reachable downstream of `service`, from the reachability index."""
+        services = self.topology.services
+        return [services[i] for i in self.reachability.descendants(self.topology.ids[service])]
+
+    def to_json(self, since: int | None = None) -> dict:
+        """
+        Serialize the graph in the `graph_to_json` shape plus its `version`.
+
+        With `since`, only services changed after that version are returned
+        (and no edges). If the topology changed after `since`, or `since` is
+        unknown, the full graph is returned with `"full": true`.
+        """
+        if since is None:
+            if self._json is None:
+                self._json = self._serialize(range(len(self.topology)), with_edges=True)
+            return self._json
+
+        full = self.needs_full(since)
+        if full:
+            payload = self._serialize(range(len(self.topology)), with_edges=True)
+        else:
+            changed = np.flatnonzero(self.node_versions > since).tolist()
+            payload = self._serialize(changed, with_edges=False)
+        payload["since"] = since
+        payload["full"] = full
+        return payload
+
+    def _serialize(self, nodes, with_edges: bool) -> dict:
+        services = self.topology.services
+        edges = self.topology.edges() if with_edges else ()
+        return {
+            "version": self.version,
+            "nodes": [node_to_json(services[node], self.node_data(node)) for node in nodes],
+            "edges": [{"source": source, "target": target} for source, target in edges],
+        }
+
+    def nbytes(self) -> int:
+        """Approximate memory held by this snapshot's arrays and indexes."""
+        return (
+            self.topology.nbytes() + self.impact_engine.nbytes() + self.reachability.nbytes()
+            + self.node_versions.nbytes + 8 * len(self.centrality)
+        )
 
-    graph.add_edges_from(edges)
+    def to_networkx(self):
+        """Materialize the snapshot as an nx.DiGraph (for serialization and scripts)."""
+        graph = nx.DiGraph()
+        for node, service in enumerate(self.topology.services):
+            graph.add_node(service, **self.node_data(node))
+        graph.add_edges_from(self.topology.edges())
+        return graph
 
-    graph.add_edges_from(edges)
 
-    # Use global telemetry state instead of static defaults
-    for service, metrics in _global_telemetry.items():
-        if service not in graph:
-            graph.add_node(service)
-        graph.nodes[service].update(metrics)
+class ServiceGraphModel:
+    """
+    Long-lived, versioned dependency graph with copy-on-write snapshots.
+
+    Writers publish telemetry under a per-model lock: the changed rows are
+    written into copies of the telemetry vectors, impact is recomputed for
+    those services alone, and the new GraphSnapshot is swapped in with a
+    single reference assignment. Readers just take `snapshot()` and never
+    lock. Blast radius and centrality are recomputed only when the topology
+    itself changes (a reload or a new service bumps `topology_version`),
+    since they do not depend on telemetry.
+
+    Every change bumps a monotonically increasing `version`, and each service
+    remembers the version it last changed at, so clients can poll with an
+    ETag or ask for only what changed since a version they already have.
+
+    `telemetry` is the environment's raw per-service dict. Publishing writes
+    it under the same lock that orders snapshots, so the dict always matches
+    the latest snapshot.
+    """
 
-    # Calculate blast radius and impact score for each node
-    max_possible_impact = len(graph.nodes()) if len(graph.nodes()) > 0 else 1.0
-    for node in graph.nodes():
-        error_rate = graph.nodes[node].get("error_rate", 0)
-        descendants = nx.descendants(graph, node)
-        blast_radius = len(descendants)
-        graph.nodes[node]["blast_radius"] = blast_radius
-        # Normalize impact score to 0-1 range based on total possible blast radius
-        raw_impact = error_rate * (1 + blast_radius)
-        graph.nodes[node]["impact_score"] = min(1.0, raw_impact / max_possible_impact)
+    def __init__(self, topology=None, telemetry=None, centrality_cache=None, loader=None):
+        self._loader = loader
+        self.telemetry = telemetry if telemetry is not None else {}
+        # Distinguishes versions of this model from those of a previous process
+        self._instance = uuid.uuid4().hex[:8]
+        self._write_lock = threading.Lock()
+        self._centrality = centrality_cache or CentralityCache()
+        if topology is None:
+            topology = loader.load() if loader else Topology.from_edges(DEPENDENCY_EDGES)
+        topology = topology.with_services(telemetry or {})
+        self._snapshot = self._with_topology(
+            None, topology, ImpactEngine(topology, [0] * len(topology), telemetry)
+        )
+
+    def _with_topology(self, current, topology, engine=None, reachability=None, centrality=None) -> GraphSnapshot:
+        """Snapshot for a new topology; every service counts as changed."""
+        if reachability is None:
+            reachability = ReachabilityIndex.from_topology(topology)
+        if centrality is None:
+            centrality = self._centrality.get(topology)
+        blast_radius = reachability.blast_radii()
+        engine = (engine or current.impact_engine).reindex(topology, blast_radius)
+        version = 1 if current is None else current.version + 1
+        return GraphSnapshot(
+            self._instance, version, version, topology, reachability,
+            centrality, engine,
+            np.full(len(topology), version, dtype=np.int64),
+        )
+
+    def _with_new_services(self, current, services) -> GraphSnapshot:
+        """
+        Snapshot with `services` appended as isolated nodes. They change no
+        other service's reachability or raw betweenness, so the index and the
+        centrality scores are extended instead of recomputed.
+        """
+        topology = current.topology.with_services(services)
+        reachability = current.reachability.with_isolated(len(topology) - len(current.topology))
+        centrality = self._centrality.extend(current.topology, topology)
+        return self._with_topology(current, topology, reachability=reachability, centrality=centrality)
+
+    def snapshot(self) -> GraphSnapshot:
+        """The current immutable snapshot (no locking needed)."""
+        return self._snapshot
+
+    def with_telemetry(self, telemetry: dict) -> GraphSnapshot:
+        """
+        Detached snapshot of the current topology carrying `telemetry` instead
+        of the live values; the model itself is not modified. Reachability and
+        centrality come from the current snapshot (extended for any services
+        the topology does not know), so only the telemetry-dependent vectors
+        are computed.
+        """
+        current = self._snapshot
+        topology = current.topology.with_services(telemetry)
+        reachability, centrality = current.reachability, current.centrality
+        added = len(topology) - len(current.topology)
+        if added:
+            reachability = reachability.with_isolated(added)
+            centrality = self._centrality.extended(current.topology, topology)
+        engine = ImpactEngine(topology, reachability.blast_radii(), telemetry)
+        return GraphSnapshot(
+            self._instance, current.version, current.topology_changed_at, topology, reachability,
+            centrality, engine, np.full(len(topology), current.version, dtype=np.int64),
+        )
+
+    def reload_topology(self):
+        """Pick up a changed topology source, if this model has a loader."""
+        if self._loader is None:
+            return
+        # A writer is already publishing; the next reader will poll instead
+        if not self._write_lock.acquire(blocking=False):
+            return
+        try:
+            topology = self._loader.poll()
+            if topology is None:
+                return
+            current = self._snapshot
+            # Services with telemetry but no known edges are kept as isolated nodes
+            engine = current.impact_engine
+            reporting = [current.services[i] for i in np.flatnonzero(engine.has_telemetry)]
+            self._snapshot = self._with_topology(current, topology.with_services(reporting))
+        finally:
+            self._write_lock.release()
+
+    def publish(self, updates: dict) -> GraphSnapshot:
+        """
+        Atomically apply telemetry for several services as one new version.
+
+        Args:
+            updates: Dict mapping service name to a dict of metric fields
+
+        Returns:
+            GraphSnapshot: The snapshot containing these updates (the current
+            one if nothing actually changed).
+        """
+        with self._write_lock:
+            current = self._snapshot
+            unknown = [service for service in updates if service not in current.topology]
+            if unknown:
+                current = self._with_new_services(current, unknown)
+
+            ids = current.topology.ids
+            engine, changed = current.impact_engine.with_updates(
+                {ids[service]: metrics for service, metrics in updates.items()}
+            )
+            if changed:
+                version = current.version + 1
+                node_versions = current.node_versions.copy()
+                node_versions[changed] = version
+                # Callers' downstream failure propagation includes these error rates
+                topology = current.topology
+                callers = [topology.predecessors(node) for node in changed]
+                node_versions[np.concatenate(callers)] = version
+                current = GraphSnapshot(
+                    self._instance, version, current.topology_changed_at, current.topology,
+                    current.reachability, current.centrality, engine, node_versions,
+                )
+            self._snapshot = current
+            # Replace whole entries so concurrent readers never see a partial dict
+            for service, metrics in updates.items():
+                self.telemetry[service] = metrics
+            return current
+
+    def update_telemetry(self, service: str, metrics: dict) -> GraphSnapshot:
+        """Publish metrics for a single service."""
+        return self.publish({service: metrics})
+
+    # Convenience reads, each against the snapshot current at call time
+
+    @property
+    def topology(self):
+        return self._snapshot.topology
+
+    @property
+    def topology_version(self) -> int:
+        return self._snapshot.topology_version
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    @property
+    def etag(self) -> str:
+        return self._snapshot.etag
+
+    def impact_scores(self) -> dict:
+        return self._snapshot.impact_scores()
+
+    def descendants(self, service: str) -> list:
+        return self._snapshot.descendants(service)
+
+    def to_json(self, since: int | None = None) -> dict:
+        return self._snapshot.to_json(since)
+
+    def to_networkx(self):
+        return self._snapshot.to_networkx()
+
+    def nbytes(self) -> int:
+        return self._snapshot.nbytes()
+
+
+# Persistent graph model of the default environment
+_graph_model = ServiceGraphModel(
+    telemetry=_global_telemetry,
+    loader=topology_loader(DEFAULT_ENVIRONMENT),
+)
+
+
+def get_graph_model() -> ServiceGraphModel:
+    """Return the default environment's graph model with any topology change picked up."""
+    _graph_model.reload_topology()
+    return _graph_model
 
-    # Calculate betweenness centrality
-    centrality_scores = nx.betweenness_centrality(graph)
 
-    for node, score in centrality_scores.items():
-        graph.nodes[node]["centrality"] = score
+def build_graph():
+    """
+    Build a directed graph representing service dependencies.
 
-    return graph
+    The underlying model is long-lived: only services whose telemetry changed
+    since the last call have their impact score recomputed.
+
+    Returns:
+        nx.DiGraph: A directed graph with service dependency edges.
+    """
+    _graph_model.reload_topology()
+    return _graph_model.to_networkx()
 
 
 def _default_telemetry():
@@ -90,14 +405,6 @@ def build_graph_with_override(telemetry_override: dict | None = None):
     Build graph, optionally overriding telemetry for specific services.
     telemetry_override: Dict with service name as key, metrics dict as value.
     """
-    graph = nx.DiGraph()
-    edges = [
-        ("frontend", "auth-service"),
-        ("auth-service", "payment-service"),
-        ("payment-service", "database"),
-    ]
-    graph.add_edges_from(edges)
-
     telemetry = _default_telemetry()
     if telemetry_override:
         for svc, metrics in telemetry_override.items():
@@ -106,61 +413,106 @@ def build_graph_with_override(telemetry_override: dict | None = None):
             else:
                 telemetry[svc] = metrics
 
-    for service, metrics in telemetry.items():
-        if service not in graph.nodes:
-            graph.add_node(service)
-        graph.nodes[service]["error_rate"] = metrics.get("error_rate", 0)
-        graph.nodes[service]["latency"] = metrics.get("latency", 0)
-        graph.nodes[service]["cpu_usage"] = metrics.get("cpu_usage", 0)
-        graph.nodes[service]["downstream_failures"] = metrics.get("downstream_failures", 0)
-
-    max_possible_impact = len(graph.nodes()) if len(graph.nodes()) > 0 else 1.0
-    for node in graph.nodes():
-        error_rate = graph.nodes[node].get("error_rate", 0)
-        descendants = nx.descendants(graph, node)
-        blast_radius = len(descendants)
-        graph.nodes[node]["blast_radius"] = blast_radius
-        # Normalize impact score to 0-1 range based on total possible blast radius
-        raw_impact = error_rate * (1 + blast_radius)
-        graph.nodes[node]["impact_score"] = min(1.0, raw_impact / max_possible_impact)
-
-    centrality_scores = nx.betweenness_centrality(graph)
-    for node, score in centrality_scores.items():
-        graph.nodes[node]["centrality"] = score
-
-    return graph
+    return get_graph_model().with_telemetry(telemetry).to_networkx()
 
 
 class GraphEngine:
-    """Engine for graph operations with attachable telemetry."""
+    """
+    Engine for graph operations with attachable telemetry.
 
-    def __init__(self):
-        self._telemetry_override = {}
+    Bound to one environment's state (see environments.py); without one it
+    works on the module-level default environment.
+    """
 
-    def attach_telemetry(self, telemetry: dict):
-        """Attach/override telemetry for a service and persist it globally."""
-        service = telemetry.get("service")
-        if service:
-            metrics = {
-                "error_rate": telemetry.get("error_rate", 0),
-                "latency": telemetry.get("latency", 0),
-                "cpu_usage": telemetry.get("cpu", 0),
-                "downstream_failures": telemetry.get("downstream_failures", 0),
-            }
-            _global_telemetry[service] = metrics
-
-    def calculate_impact(self) -> dict:
-        """Build graph with current global telemetry and return impact scores."""
-        graph = build_graph()  # Now uses global state
+    def __init__(self, environment=None):
+        self._telemetry_override = {}
+        self._environment = environment
+
+    @property
+    def telemetry(self) -> dict:
+        """Latest raw telemetry per service for this engine's environment."""
+        if self._environment is None:
+            return _global_telemetry
+        return self._environment.telemetry
+
+    @property
+    def model(self) -> ServiceGraphModel:
+        """The ServiceGraphModel this engine reads and writes."""
+        if self._environment is None:
+            return get_graph_model()
+        model = self._environment.graph_model
+        model.reload_topology()
+        # Size accounting for eviction, refreshed off the registry lock
+        self._environment.measure()
+        return model
+
+    def snapshot(self) -> GraphSnapshot:
+        """Current immutable snapshot of this environment's graph."""
+        return self.model.snapshot()
+
+    def _measure(self):
+        if self._environment is not None:
+            self._environment.measure()
+
+    @staticmethod
+    def _metrics(telemetry: dict) -> dict:
         return {
-            node: graph.nodes[node].get("impact_score", 0)
-            for node in graph.nodes()
+            "error_rate": telemetry.get("error_rate", 0),
+            "latency": telemetry.get("latency", 0),
+            "cpu_usage": telemetry.get("cpu", 0),
+            "downstream_failures": telemetry.get("downstream_failures", 0),
         }
 
+    def attach_telemetry(self, telemetry: dict):
+        """
+        Attach/override telemetry for a service and persist it in the environment.
+
+        Returns:
+            GraphSnapshot: The snapshot that includes this telemetry.
+        """
+        return self.attach_telemetry_batch([telemetry])
+
+    def attach_telemetry_batch(self, telemetries: list):
+        """
+        Publish telemetry for several services as one atomic version.
+
+        Returns:
+            GraphSnapshot: The snapshot that includes all of these updates, so
+            callers can keep reading a consistent view under concurrent writes.
+        """
+        updates = {}
+        for telemetry in telemetries:
+            service = telemetry.get("service")
+            if service:
+                updates[service] = self._metrics(telemetry)
+        # The model also updates the raw telemetry dict, in publish order
+        snapshot = self.model.publish(updates)
+        self._measure()
+        return snapshot
+
+    def calculate_impact(self, snapshot: GraphSnapshot | None = None) -> dict:
+        """Return impact scores from `snapshot`, or from the current one."""
+        return (snapshot or self.snapshot()).impact_scores()
+
     def reset_telemetry(self):
-        """Restore global telemetry to default healthy values."""
-        global _global_telemetry
-        _global_telemetry.update(_default_telemetry())
+        """Restore telemetry to default healthy values."""
+        self.model.publish(_default_telemetry())
+        self._measure()
+
+
+def node_to_json(node, data: dict) -> dict:
+    """JSON shape of a single service node."""
+    return {
+        "id": node,
+        "error_rate": data.get("error_rate"),
+        "latency": data.get("latency"),
+        "cpu_usage": data.get("cpu_usage"),
+        "downstream_failures": data.get("downstream_failures"),
+        "blast_radius": data.get("blast_radius"),
+        "impact_score": data.get("impact_score"),
+        "blast_weighted_error": data.get("blast_weighted_error"),
+        "downstream_failure_propagation": data.get("downstream_failure_propagation"),
+    }
 
 
 def graph_to_json(graph):
@@ -175,16 +527,7 @@ def graph_to_json(graph):
     """
     nodes = []
     for node, data in graph.nodes(data=True):
-        node_dict = {
-            "id": node,
-            "error_rate": data.get("error_rate"),
-            "latency": data.get("latency"),
-            "cpu_usage": data.get("cpu_usage"),
-            "downstream_failures": data.get("downstream_failures"),
-            "blast_radius": data.get("blast_radius"),
-            "impact_score": data.get("impact_score"),
-        }
-        nodes.append(node_dict)
+        nodes.append(node_to_json(node, data))
 
     edges = []
     for source, target in graph.edges():
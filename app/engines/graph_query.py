@@ -0,0 +1,151 @@
+"""
+graph_query.py
+--------------
+Neighborhood-scoped, filtered and paginated views of the service graph.
+
+Instead of serializing the whole fleet and filtering on the client, the
+subgraph is selected server-side:
+  1. Optional k-hop ego graph around a service, following dependencies
+     (downstream), callers (upstream) or both, via bounded BFS over the CSR
+     adjacency — only the visited neighborhood is ever touched.
+  2. Optional minimum impact score and `since` version filters.
+  3. Cursor pagination over service ids.
+"""
+
+import numpy as np
+
+from app.engines.graph_engine import node_to_json
+
+# ---------------------------------------------------------------------------
+# Constants
+# ---------------------------------------------------------------------------
+
+DIRECTIONS = ("downstream", "upstream", "both")
+
+
+# ---------------------------------------------------------------------------
+# Helper — bounded traversal
+# ---------------------------------------------------------------------------
+
+def _adjacency(topology, direction: str) -> list:
+    """(indptr, indices) pairs to follow for the given direction."""
+    forward = (topology.indptr, topology.indices)
+    reverse = (topology.rev_indptr, topology.rev_indices)
+    if direction == "downstream":
+        return [forward]
+    if direction == "upstream":
+        return [reverse]
+    return [forward, reverse]
+
+
+def k_hop_neighborhood(topology, start: int, hops: int, direction: str = "both") -> np.ndarray:
+    """
+    Ids of every service within `hops` edges of `start` (including `start`),
+    sorted ascending. Only the neighborhood itself is visited.
+    """
+    if direction not in DIRECTIONS:
+        raise ValueError(f"direction must be one of {DIRECTIONS}, got {direction!r}")
+
+    adjacency = _adjacency(topology, direction)
+    visited = {start}
+    frontier = [start]
+    for _ in range(hops):
+        next_frontier = []
+        for node in frontier:
+            for indptr, indices in adjacency:
+                for neighbor in indices[indptr[node]:indptr[node + 1]].tolist():
+                    if neighbor not in visited:
+                        visited.add(neighbor)
+                        next_frontier.append(neighbor)
+        if not next_frontier:
+            break
+        frontier = next_frontier
+
+    return np.array(sorted(visited), dtype=np.int64)
+
+
+# ---------------------------------------------------------------------------
+# Public entry-point
+# ---------------------------------------------------------------------------
+
+def query_graph(
+    snapshot,
+    service: str | None = None,
+    hops: int = 1,
+    direction: str = "both",
+    min_impact: float | None = None,
+    since: int | None = None,
+    cursor: int | None = None,
+    limit: int | None = None,
+) -> dict:
+    """
+    Select, filter and paginate part of one GraphSnapshot.
+
+    Parameters
+    ----------
+    service : str, optional
+        Centre of the ego graph. Without it every service is a candidate.
+    hops, direction
+        Radius and direction of the ego graph around `service`.
+    min_impact : float, optional
+        Drop services whose impact score is below this value.
+    since : int, optional
+        Keep only services changed after this graph version. If the topology
+        changed after it (or it is unknown) nothing is dropped and the result
+        has ``full: true``, so the caller replaces its state.
+    cursor : int, optional
+        Return services with ids greater than this (from `next_cursor`).
+    limit : int, optional
+        Page size; `next_cursor` is null on the last page.
+
+    Returns
+    -------
+    dict
+        ``version``, ``nodes``, ``edges`` (edges between selected services,
+        each listed on the page of its source) and ``next_cursor``; with
+        `since`, also ``since`` and ``full``.
+
+    Raises
+    ------
+    KeyError
+        If `service` is not part of the topology.
+    """
+    topology = snapshot.topology
+
+    if service is not None:
+        if service not in topology:
+            raise KeyError(service)
+        selected = k_hop_neighborhood(topology, topology.ids[service], hops, direction)
+    else:
+        selected = np.arange(len(topology), dtype=np.int64)
+
+    if min_impact is not None:
+        selected = selected[snapshot.impact_engine.impact[selected] >= min_impact]
+    full = since is not None and snapshot.needs_full(since)
+    if since is not None and not full:
+        selected = selected[snapshot.node_versions[selected] > since]
+
+    page = selected if cursor is None else selected[selected > cursor]
+    next_cursor = None
+    if limit is not None and page.shape[0] > limit:
+        page = page[:limit]
+        next_cursor = int(page[-1])
+
+    in_selection = set(selected.tolist())
+    services = topology.services
+    edges = []
+    for node in page.tolist():
+        for child in topology.successors(node).tolist():
+            if child in in_selection:
+                edges.append({"source": services[node], "target": services[child]})
+
+    payload = {
+        "version": snapshot.version,
+        "nodes": [node_to_json(services[node], snapshot.node_data(node)) for node in page.tolist()],
+        "edges": edges,
+        "next_cursor": next_cursor,
+    }
+    if since is not None:
+        payload["since"] = since
+        payload["full"] = full
+    return payload
@@ -0,0 +1,167 @@
+"""
+impact_engine.py
+----------------
+Vectorized impact scoring for the whole fleet.
+
+Telemetry is kept as one dense ``(N, 4)`` matrix whose rows are indexed by
+service id and whose columns follow ``METRIC_FIELDS``; the dependency graph is
+a SciPy sparse matrix built straight from the topology's CSR arrays. Impact,
+blast-radius-weighted error and downstream failure propagation are each one
+NumPy/SciPy expression over every service instead of a Python loop per node.
+
+Engines are never modified once built: `with_updates` copies the vectors,
+writes the changed rows and recomputes impact for those rows only, so readers
+holding an older engine always see one consistent version.
+"""
+
+import numpy as np
+from scipy import sparse
+
+# ---------------------------------------------------------------------------
+# Constants
+# ---------------------------------------------------------------------------
+
+# Column order of the telemetry matrix
+METRIC_FIELDS = ("error_rate", "latency", "cpu_usage", "downstream_failures")
+
+ERROR_RATE = METRIC_FIELDS.index("error_rate")
+
+
+# ---------------------------------------------------------------------------
+# Vectorized kernels
+# ---------------------------------------------------------------------------
+
+def adjacency_matrix(topology) -> sparse.csr_matrix:
+    """Sparse ``A`` with ``A[i, j] = 1`` when service ``i`` depends on ``j``."""
+    node_count = len(topology)
+    data = np.ones(topology.edge_count, dtype=np.float64)
+    return sparse.csr_matrix(
+        (data, topology.indices, topology.indptr), shape=(node_count, node_count)
+    )
+
+
+def impact_scores(error_rate: np.ndarray, blast_radius: np.ndarray, node_count: int) -> np.ndarray:
+    """Impact normalized to 0-1 by the total possible blast radius."""
+    max_possible_impact = node_count if node_count > 0 else 1.0
+    return np.minimum(1.0, error_rate * (1.0 + blast_radius) / max_possible_impact)
+
+
+def blast_weighted_error(error_rate: np.ndarray, blast_radius: np.ndarray) -> np.ndarray:
+    """Error rate scaled by how many services sit downstream of each service."""
+    return error_rate * blast_radius
+
+
+def downstream_failure_propagation(adjacency: sparse.csr_matrix, error_rate: np.ndarray) -> np.ndarray:
+    """Sum of the error rates of each service's direct dependencies (``A @ e``)."""
+    return adjacency @ error_rate
+
+
+# ---------------------------------------------------------------------------
+# Fleet-wide engine
+# ---------------------------------------------------------------------------
+
+class ImpactEngine:
+    """Read-only telemetry vectors and impact scores for one topology."""
+
+    def __init__(self, topology, blast_radius, telemetry: dict | None = None):
+        node_count = len(topology)
+        self.topology = topology
+        self.blast_radius = np.asarray(blast_radius, dtype=np.float64)
+        self.adjacency = adjacency_matrix(topology)
+        self.metrics = np.zeros((node_count, len(METRIC_FIELDS)), dtype=np.float64)
+        self.has_telemetry = np.zeros(node_count, dtype=bool)
+        for service, values in (telemetry or {}).items():
+            if service in topology:
+                self._write(topology.ids[service], values)
+        self.impact = impact_scores(self.error_rate, self.blast_radius, node_count)
+        self._freeze()
+
+    def _freeze(self):
+        for array in (self.metrics, self.has_telemetry, self.impact, self.blast_radius):
+            array.flags.writeable = False
+
+    def _write(self, node: int, values: dict) -> bool:
+        row = self.metrics[node]
+        changed = not self.has_telemetry[node]
+        for column, field in enumerate(METRIC_FIELDS):
+            if field in values and row[column] != values[field]:
+                row[column] = values[field]
+                changed = True
+        self.has_telemetry[node] = True
+        return changed
+
+    def _derive(self):
+        """Shallow copy sharing the topology-derived arrays."""
+        engine = ImpactEngine.__new__(ImpactEngine)
+        engine.topology = self.topology
+        engine.blast_radius = self.blast_radius
+        engine.adjacency = self.adjacency
+        return engine
+
+    @property
+    def error_rate(self) -> np.ndarray:
+        return self.metrics[:, ERROR_RATE]
+
+    def with_updates(self, updates: dict):
+        """
+        Copy-on-write update of several services at once.
+
+        Args:
+            updates: Dict mapping service id to a dict of metric fields
+
+        Returns:
+            Tuple of (new ImpactEngine, list of ids whose values changed).
+            If nothing changed, the engine returned is `self`.
+        """
+        engine = self._derive()
+        engine.metrics = self.metrics.copy()
+        engine.has_telemetry = self.has_telemetry.copy()
+        changed = [node for node, values in updates.items() if engine._write(node, values)]
+        if not changed:
+            return self, []
+
+        engine.impact = self.impact.copy()
+        nodes = np.array(changed, dtype=np.int64)
+        engine.impact[nodes] = impact_scores(
+            engine.error_rate[nodes], self.blast_radius[nodes], len(self.topology)
+        )
+        engine._freeze()
+        return engine, changed
+
+    def blast_weighted_error(self) -> np.ndarray:
+        return blast_weighted_error(self.error_rate, self.blast_radius)
+
+    def downstream_failure_propagation(self) -> np.ndarray:
+        return downstream_failure_propagation(self.adjacency, self.error_rate)
+
+    def node_metrics(self, node: int) -> dict:
+        """Telemetry of one service as a plain dict (empty if none was reported)."""
+        if not self.has_telemetry[node]:
+            return {}
+        values = dict(zip(METRIC_FIELDS, self.metrics[node].tolist()))
+        values["downstream_failures"] = int(values["downstream_failures"])
+        return values
+
+    def reindex(self, topology, blast_radius):
+        """Return an engine for a new topology, carrying telemetry over by service name."""
+        engine = ImpactEngine(topology, blast_radius)
+        old_ids = np.array(
+            [self.topology.ids.get(service, -1) for service in topology.services], dtype=np.int64
+        )
+        kept = old_ids >= 0
+        metrics = engine.metrics.copy()
+        has_telemetry = engine.has_telemetry.copy()
+        metrics[kept] = self.metrics[old_ids[kept]]
+        has_telemetry[kept] = self.has_telemetry[old_ids[kept]]
+        engine.metrics, engine.has_telemetry = metrics, has_telemetry
+        engine.impact = impact_scores(engine.error_rate, engine.blast_radius, len(topology))
+        engine._freeze()
+        return engine
+
+    def nbytes(self) -> int:
+        """Memory held by the vectors and the sparse adjacency."""
+        adjacency = self.adjacency.data.nbytes + self.adjacency.indices.nbytes + self.adjacency.indptr.nbytes
+        return (
+            self.metrics.nbytes + self.has_telemetry.nbytes + self.impact.nbytes
+            + self.blast_radius.nbytes + adjacency
+        )
@@ -15,18 +15,26 @@ def generate_telemetry(service, error_rate, latency, cpu, downstream):
     }
 
 
-def run_pipeline(telemetry, graph_engine, ml_engine):
+def run_pipeline(telemetry, graph_engine, ml_engine, ranking_mode="impact"):
     # Attach telemetry to graph
-    graph_engine.attach_telemetry(telemetry)
+    snapshot = graph_engine.attach_telemetry(telemetry)
 
     # Recalculate impact
-    impact_scores = graph_engine.calculate_impact()
+    impact_scores = graph_engine.calculate_impact(snapshot)
 
     # Rank root causes
-    ranking = ml_engine.rank_services(impact_scores)
+    if ranking_mode == "propagation":
+        ranking = ml_engine.rank_services_propagation(snapshot)
+        ranked = [
+            {"service": s, "impact_score": impact_scores.get(s, 0), "root_cause_score": score}
+            for s, score in ranking
+        ]
+    else:
+        ranking = ml_engine.rank_services(impact_scores)
+        ranked = [{"service": s, "impact_score": score} for s, score in ranking]
 
     return {
         "telemetry": telemetry,
         "impact_scores": dict(impact_scores),
-        "ranking": [{"service": s, "impact_score": score} for s, score in ranking],
+        "ranking": ranked,
     }
@@ -0,0 +1,98 @@
+"""
+inference.py
+------------
+Allocation-light feature preparation for the root-cause model.
+
+Prediction and explanation share one capping table (`FEATURE_BOUNDS`) and
+write capped features straight into a preallocated, per-thread NumPy buffer
+in `FEATURE_COLUMNS` order. No pandas objects or intermediate dicts are built
+per request; the buffer only grows when a larger batch arrives.
+"""
+
+import threading
+
+import numpy as np
+
+# ---------------------------------------------------------------------------
+# Constants
+# ---------------------------------------------------------------------------
+
+FEATURE_COLUMNS = ['error_rate', 'latency', 'cpu_usage', 'downstream_failures', 'impact_score']
+
+# Expected training range of each feature; inputs are capped to it
+FEATURE_BOUNDS = {
+    'error_rate': (0.0, 1.0),
+    'latency': (0.0, 5000.0),
+    'cpu_usage': (0.0, 100.0),
+    'downstream_failures': (0.0, 10.0),
+    'impact_score': (0.0, 1.0),
+}
+
+FEATURE_LOWER = np.array([FEATURE_BOUNDS[column][0] for column in FEATURE_COLUMNS])
+FEATURE_UPPER = np.array([FEATURE_BOUNDS[column][1] for column in FEATURE_COLUMNS])
+
+# Rows preallocated per thread before the first batch arrives
+INITIAL_BUFFER_ROWS = 64
+
+
+# ---------------------------------------------------------------------------
+# Reusable buffers
+# ---------------------------------------------------------------------------
+
+class FeatureBuffer:
+    """Growable ``(rows, len(FEATURE_COLUMNS))`` float64 matrix reused across calls."""
+
+    def __init__(self, capacity: int = INITIAL_BUFFER_ROWS):
+        self._array = np.empty((capacity, len(FEATURE_COLUMNS)), dtype=np.float64)
+
+    @property
+    def capacity(self) -> int:
+        return self._array.shape[0]
+
+    def fill(self, batch) -> np.ndarray:
+        """
+        Write the capped features of every dict in `batch` (missing ones
+        default to 0) and return a view of the filled rows. `batch` may also
+        be a ready ``(rows, len(FEATURE_COLUMNS))`` array, e.g. a whole fleet.
+        """
+        rows = len(batch)
+        if rows > self.capacity:
+            self._array = np.empty((max(rows, 2 * self.capacity), len(FEATURE_COLUMNS)), dtype=np.float64)
+        X = self._array[:rows]
+        if isinstance(batch, np.ndarray):
+            X[:] = batch
+        else:
+            for row, features in enumerate(batch):
+                get = features.get
+                X[row] = [get(column, 0) for column in FEATURE_COLUMNS]
+        return np.clip(X, FEATURE_LOWER, FEATURE_UPPER, out=X)
+
+
+_local = threading.local()
+
+
+def thread_buffer() -> FeatureBuffer:
+    """The calling thread's FeatureBuffer, created on first use."""
+    buffer = getattr(_local, "buffer", None)
+    if buffer is None:
+        buffer = _local.buffer = FeatureBuffer()
+    return buffer
+
+
+# ---------------------------------------------------------------------------
+# Public entry-points
+# ---------------------------------------------------------------------------
+
+def feature_matrix(batch) -> np.ndarray:
+    """
+    Capped ``(len(batch), len(FEATURE_COLUMNS))`` feature matrix.
+
+    The result is a view of the calling thread's buffer: it stays valid until
+    the same thread prepares its next batch, so copy it to keep it longer.
+    """
+    return thread_buffer().fill(batch)
+
+
+def feature_vector(features: dict) -> np.ndarray:
+    """Capped features of one service as a ``(1, len(FEATURE_COLUMNS))`` buffer view."""
+    return thread_buffer().fill((features,))
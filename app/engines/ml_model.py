@@ -1,25 +1,104 @@
+"""
+ml_model.py
+-----------
+XGBoost root-cause classifier: probability that a service is the origin of
+an incident, given its telemetry and graph impact score.
+
+Training is an offline step (``python -m app.engines.ml_model``). Each run
+registers a new version in the on-disk ModelRegistry (native JSON/UBJ plus
+metadata with the feature-schema hash), and serving processes load the
+`primary` version once at start-up. An artifact built for a different
+feature schema is rejected instead of silently mis-scoring. A `shadow`
+version, if any, is scored in the background on the same feature matrices.
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import threading
+from pathlib import Path
+
 import numpy as np
-import pandas as pd
 from xgboost import XGBClassifier
-from sklearn.model_selection import train_test_split
 
-# Singleton model
-_model = None
+from app.engines.inference import (
+    FEATURE_COLUMNS,
+    FEATURE_LOWER,
+    FEATURE_UPPER,
+    feature_matrix,
+)
+from app.engines.explanation_cache import ExplanationCache
+from app.engines.model_registry import MODEL_FORMATS, PRIMARY_ALIAS, SHADOW_ALIAS, ModelRegistry
+from app.engines.onnx_backend import export_onnx, load_onnx_scorer
+from app.engines.prediction_cache import PredictionCache
+from app.engines.shadow_scoring import ShadowScorer
+from app.engines.shard_training import TRAINING_ROUNDS, train_from_shards
+from app.engines.sharded_inference import ShardedScorer, rank_scores
+from app.engines.tree_inference import CompiledTrees
 
-FEATURE_COLUMNS = ['error_rate', 'latency', 'cpu_usage', 'downstream_failures', 'impact_score']
+# ---------------------------------------------------------------------------
+# Constants
+# ---------------------------------------------------------------------------
 
-def train_model(force_retrain=False):
-    global _model
-    if _model is not None and not force_retrain:
-        return _model
+# Identifies the feature layout a persisted model was trained on
+FEATURE_SCHEMA_HASH = hashlib.sha256(json.dumps(FEATURE_COLUMNS).encode()).hexdigest()[:16]
+
+# Where model artifacts are written and loaded from
+MODEL_DIR = Path(os.environ.get(
+    "KAIROS_MODEL_DIR", Path(__file__).resolve().parents[2] / "models"
+))
+
+# Native XGBoost serialization format: "ubj" (binary) or "json"
+MODEL_FORMAT = os.environ.get("KAIROS_MODEL_FORMAT", "ubj")
+
+MODEL_NAME = "root_cause"
+
+# Time the sharding/threading configurations at start-up and keep the fastest.
+# Off by default: benchmarking adds seconds of machine-dependent start-up time.
+AUTOTUNE_INFERENCE = os.environ.get("KAIROS_AUTOTUNE_INFERENCE", "0") == "1"
+
+# Recorded-history shards (files or directories, os.pathsep-separated) used
+# for training instead of the synthetic dataset
+TRAINING_SHARDS = [path for path in os.environ.get("KAIROS_TRAINING_SHARDS", "").split(os.pathsep) if path]
+
+# Inference backend: "xgboost" (Booster.inplace_predict), "numpy" (CompiledTrees)
+# or "onnx" (onnxruntime session, parity-checked against XGBoost at load time)
+INFERENCE_BACKEND = os.environ.get("KAIROS_INFERENCE_BACKEND", "xgboost")
+
+# The NumPy backend only wins on small batches; larger ones go to the booster
+NUMPY_BACKEND_MAX_ROWS = int(os.environ.get("KAIROS_NUMPY_BACKEND_MAX_ROWS", "32"))
+
+# ServingModel currently published; replaced as a whole on retrain
+_serving = None
+_load_lock = threading.Lock()
+
+# Candidate scored in the background on the primary's feature matrices
+_shadow = None
+shadow_scorer = ShadowScorer()
+
+# Per-row probabilities of recently scored feature vectors
+prediction_cache = PredictionCache()
+
+# Explanation payloads of recently explained services
+explanation_cache = ExplanationCache()
+
+# Splits large batches across cores; its config is auto-tuned at start-up
+sharded_scorer = ShardedScorer()
+
+
+# ---------------------------------------------------------------------------
+# Helper — training
+# ---------------------------------------------------------------------------
 
-    if force_retrain:
-        print("🔄 Force-retraining ML model...")
-        _model = None
+def _synthetic_training_data(n_samples: int = 1500, seed: int = 42):
+    """Labelled synthetic telemetry; returns (X, y)."""
+    # Only the offline helpers use pandas. This doesn't slim the serving process:
+    # importing xgboost already loads pandas and scikit-learn when installed.
+    import pandas as pd
 
-    # Generate synthetic dataset
-    np.random.seed(42)
-    n_samples = 1500
+    np.random.seed(seed)
 
     # Features
     error_rate = np.random.uniform(0, 1, n_samples)
@@ -43,30 +122,319 @@ def train_model(force_retrain=False):
         'impact_score': impact_score,
         'target': target
     })
+    return df[FEATURE_COLUMNS], df['target']
 
-    X = df[FEATURE_COLUMNS]
-    y = df['target']
 
+def fit_model(callbacks=None) -> XGBClassifier:
+    """Fit a fresh classifier on the synthetic training set; `callbacks` run after each round."""
+    from sklearn.model_selection import train_test_split
+
+    X, y = _synthetic_training_data()
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
-    _model = XGBClassifier(n_estimators=100, random_state=42)
-    _model.fit(X_train, y_train)
+    model = XGBClassifier(n_estimators=TRAINING_ROUNDS, random_state=42, callbacks=callbacks)
+    model.fit(X_train, y_train)
+    # The callbacks only matter while fitting; keep them out of the persisted params
+    model.set_params(callbacks=None)
+    return model
+
+
+# ---------------------------------------------------------------------------
+# Helper — persistence
+# ---------------------------------------------------------------------------
+
+def model_registry(directory=None) -> ModelRegistry:
+    """Registry holding the versioned artifacts in `directory` (default MODEL_DIR)."""
+    return ModelRegistry(directory or MODEL_DIR)
+
+
+def load_model(directory=None, version: int | None = None, alias: str = PRIMARY_ALIAS) -> tuple:
+    """
+    Load a registered classifier: the given `version`, else the one `alias`
+    points to, else the latest.
+
+    Returns:
+        Tuple of (XGBClassifier, metadata dict), or (None, None) if no
+        artifact exists.
+
+    Raises:
+        ValueError: If the artifact was trained on a different feature schema.
+    """
+    model, meta = model_registry(directory).load(MODEL_NAME, version, alias)
+    if meta is not None and meta.get("feature_schema_hash") != FEATURE_SCHEMA_HASH:
+        raise ValueError(
+            f"Model artifact v{meta.get('version')} was trained on features "
+            f"{meta.get('feature_columns')}, expected {FEATURE_COLUMNS}"
+        )
+    return model, meta
+
+
+# ---------------------------------------------------------------------------
+# Serving model
+# ---------------------------------------------------------------------------
+
+class ServingModel:
+    """
+    A loaded classifier plus everything derived from it. It is published as a
+    single reference, so a request holding one never sees a half-swapped model.
+    """
+
+    # Unique per loaded model, even when two share a registry version
+    _generations = itertools.count(1)
+
+    def __init__(self, model: XGBClassifier, meta: dict | None = None):
+        self.model = model
+        self.meta = meta or {}
+        self.version = self.meta.get("version", 0)
+        self.generation = next(self._generations)
+        # Private copies, so the tuned thread counts never leak into another model.
+        # nthread is a booster parameter, so each batch-size class gets its own.
+        self.booster = model.get_booster().copy()
+        self.booster.set_param({"nthread": sharded_scorer.config.nthread})
+        self.small_booster = self.booster
+        if sharded_scorer.small_config.nthread != sharded_scorer.config.nthread:
+            self.small_booster = model.get_booster().copy()
+            self.small_booster.set_param({"nthread": sharded_scorer.small_config.nthread})
+        self._trees = None
+        self._explainer = None
+        self._lock = threading.Lock()
+        self.onnx = self._load_onnx() if INFERENCE_BACKEND == "onnx" else None
+
+    def _load_onnx(self):
+        try:
+            return load_onnx_scorer(self.model)
+        except (ImportError, ValueError) as exc:
+            print(f"⚠️ ONNX backend unavailable for model v{self.version}, using XGBoost: {exc}")
+            return None
+
+    @property
+    def trees(self) -> CompiledTrees:
+        """NumPy export of the booster, built on first use."""
+        if self._trees is None:
+            with self._lock:
+                if self._trees is None:
+                    self._trees = CompiledTrees.from_booster(self.booster)
+        return self._trees
+
+    @property
+    def explainer(self):
+        """SHAP TreeExplainer for this model, built on first use and shared by all threads."""
+        if self._explainer is None:
+            with self._lock:
+                if self._explainer is None:
+                    import shap
+                    self._explainer = shap.TreeExplainer(self.model)
+        return self._explainer
+
+
+def install_model(model: XGBClassifier, meta: dict | None = None) -> ServingModel:
+    """
+    Publish `model` for serving with one reference swap. Requests already
+    scoring keep the model they started with.
+    """
+    global _serving
+    serving = ServingModel(model, meta)
+    _serving = serving
+    # Entries are keyed on the generation and could never hit again
+    prediction_cache.clear()
+    explanation_cache.clear()
+    return serving
+
+
+# ---------------------------------------------------------------------------
+# Public entry-points
+# ---------------------------------------------------------------------------
+
+def retrain_and_save(directory=None, fmt: str | None = None, promote: bool = True,
+                     shards=None, continue_training: bool = False, callbacks=None) -> tuple:
+    """
+    Fit a new model and register it as the next version; returns (model, meta).
+
+    With `shards` (default TRAINING_SHARDS) the model is trained out-of-core
+    from recorded history, optionally continuing to boost from the current
+    primary; otherwise it is fitted on the synthetic dataset. With `promote`
+    it becomes the primary, otherwise the shadow candidate. `callbacks`
+    (XGBoost TrainingCallbacks) run after every boosting round.
+    """
+    shards = shards or TRAINING_SHARDS
+    if shards:
+        init_model, init_meta = load_model(directory) if continue_training else (None, None)
+        model, training = train_from_shards(shards, init_model=init_model, callbacks=callbacks)
+        if init_meta is not None:
+            training["continued_from"] = init_meta["version"]
+    else:
+        model, training = fit_model(callbacks), {"source": "synthetic"}
+
+    meta = model_registry(directory).register(
+        model,
+        MODEL_NAME,
+        fmt or MODEL_FORMAT,
+        metadata={
+            "feature_columns": FEATURE_COLUMNS,
+            "feature_schema_hash": FEATURE_SCHEMA_HASH,
+            "training": training,
+        },
+        aliases=(PRIMARY_ALIAS,) if promote else (SHADOW_ALIAS,),
+    )
+    return model, meta
+
+
+def load_serving_model(directory=None) -> XGBClassifier:
+    """
+    Load the persisted model into the serving singleton (called at start-up).
+
+    Falls back to training (and persisting) a model only when no usable
+    artifact exists, so a fresh checkout still starts.
+    """
+    try:
+        model, meta = load_model(directory)
+    except ValueError as exc:
+        print(f"⚠️ {exc}; retraining")
+        model = None
+    if model is None:
+        print("⚠️ No persisted ML model found, training one now...")
+        model, meta = retrain_and_save(directory)
+    serving = install_model(model, meta)
+
+    try:
+        shadow, shadow_meta = load_model(directory, alias=SHADOW_ALIAS)
+    except ValueError as exc:
+        print(f"⚠️ Ignoring shadow model: {exc}")
+        shadow = None
+    if shadow is not None and shadow_meta["version"] != serving.version:
+        install_shadow(shadow, shadow_meta)
+    return serving.model
+
+
+def install_shadow(model: XGBClassifier | None, meta: dict | None = None):
+    """Start (or with None, stop) shadow-scoring `model` against the primary."""
+    global _shadow
+    _shadow = ServingModel(model, meta) if model is not None else None
+    shadow_scorer.reset_stats()
+    return _shadow
+
+
+def shadow_model():
+    """The ServingModel being shadow-scored, or None."""
+    return _shadow
+
+
+def current_model() -> ServingModel:
+    """The model being served, loading it on first use."""
+    serving = _serving
+    if serving is None:
+        with _load_lock:
+            if _serving is None:
+                load_serving_model()
+            serving = _serving
+    return serving
+
+
+def autotune_inference() -> dict:
+    """
+    Pick the fastest nthread/shard configuration for this machine and
+    republish the serving model with it (called at start-up).
+    """
+    serving = current_model()
+    config = sharded_scorer.autotune(serving.booster)
+    small = sharded_scorer.small_config
+    install_model(serving.model, serving.meta)
+    print(
+        f"⚙️ Inference tuned: nthread={config.nthread}, shard_rows={config.shard_rows}, "
+        f"workers={config.workers} ({config.seconds * 1000:.1f} ms per fleet); "
+        f"small batches nthread={small.nthread} ({small.seconds * 1e6:.0f} µs per batch)"
+    )
+    return {**config.to_json(), "small_batch": small.to_json()}
+
+
+def model_version() -> int:
+    """Version of the model currently served (0 before one is loaded)."""
+    serving = _serving
+    return serving.version if serving is not None else 0
+
+
+def train_model(force_retrain=False):
+    if not force_retrain:
+        return current_model().model
+
+    # Serving continues on the current model until the new one is installed
+    print("🔄 Force-retraining ML model...")
+    model, meta = retrain_and_save()
+    return install_model(model, meta).model
+
+
+def _score(serving: ServingModel, X: np.ndarray) -> np.ndarray:
+    if serving.onnx is not None:
+        return serving.onnx.predict_proba(X)
+    if INFERENCE_BACKEND == "numpy" and X.shape[0] <= NUMPY_BACKEND_MAX_ROWS:
+        return serving.trees.predict_proba(X)
+    # binary:logistic, so the booster's raw prediction is the positive-class probability
+    config = sharded_scorer.config_for(X.shape[0])
+    booster = serving.small_booster if config is sharded_scorer.small_config else serving.booster
+    return sharded_scorer.score(booster, X, config)
+
+
+def predict_service_probabilities(batch, services=None) -> np.ndarray:
+    """
+    Root-cause probability for every feature dict in `batch`, scored with a
+    single model call on the thread's preallocated feature buffer. Rows found
+    in the prediction cache skip the model entirely.
+
+    If a shadow model is installed, the same matrix is queued for background
+    scoring; `services` labels its rows in the shadow log.
+
+    Returns:
+        np.ndarray: Probability of the positive class, in `batch` order.
+    """
+    serving = current_model()
+    X = feature_matrix(batch)
+    if X.shape[0] == 0:
+        return np.zeros(0)
+    if prediction_cache.enabled:
+        keys = prediction_cache.keys(serving.generation, X)
+        probs, missing = prediction_cache.lookup(keys)
+        if missing:
+            probs[missing] = _score(serving, X[missing])
+            prediction_cache.store([keys[i] for i in missing], probs[missing])
+    else:
+        probs = _score(serving, X)
+
+    shadow = _shadow
+    if shadow is not None:
+        shadow_scorer.submit(shadow, X, probs, serving.version, services)
+    return probs
 
-    return _model
 
 def predict_service_probability(features: dict) -> float:
-    model = train_model()
-    # Normalize and cap features to stay within expected training ranges
-    # error_rate: 0-1, latency: 0-5000, cpu_usage: 0-100, downstream_failures: 0-10, impact_score: 0-1
-    capped_features = {
-        'error_rate': min(1.0, max(0.0, float(features.get('error_rate', 0)))),
-        'latency': min(5000.0, max(0.0, float(features.get('latency', 0)))),
-        'cpu_usage': min(100.0, max(0.0, float(features.get('cpu_usage', 0)))),
-        'downstream_failures': min(10.0, max(0.0, float(features.get('downstream_failures', 0)))),
-        'impact_score': min(1.0, max(0.0, float(features.get('impact_score', 0))))
-    }
-    
-    # Ensure features are in the correct order for the model
-    input_df = pd.DataFrame([capped_features])[FEATURE_COLUMNS]
-    prob = model.predict_proba(input_df)[0][1]  # Probability of positive class
-    return float(prob)
\ No newline at end of file
+    return float(predict_service_probabilities([features])[0])
+
+
+def rank_service_probabilities(batch, services: list, top_k: int | None = None) -> list:
+    """
+    Score a whole fleet (feature dicts or a feature matrix, one row per entry
+    of `services`) and return (service, probability) pairs, highest first.
+    """
+    return rank_scores(predict_service_probabilities(batch, services), services, top_k)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train and persist the root-cause model.")
+    parser.add_argument("--model-dir", default=None, help=f"artifact directory (default {MODEL_DIR})")
+    parser.add_argument("--format", choices=MODEL_FORMATS, default=None, help="serialization format")
+    parser.add_argument("--shadow", action="store_true", help="register as the shadow candidate instead of promoting")
+    parser.add_argument("--shards", nargs="+", default=None, help="train out-of-core from these shard files/directories")
+    parser.add_argument("--continue", dest="continue_training", action="store_true",
+                        help="continue boosting from the current primary model (with --shards)")
+    parser.add_argument("--onnx", action="store_true", help="also export the new version as model.onnx")
+    args = parser.parse_args()
+
+    model, meta = retrain_and_save(
+        args.model_dir, args.format, promote=not args.shadow,
+        shards=args.shards, continue_training=args.continue_training,
+    )
+    role = SHADOW_ALIAS if args.shadow else PRIMARY_ALIAS
+    version_dir = model_registry(args.model_dir).version_dir(MODEL_NAME, meta["version"])
+    print(f"✅ Registered {meta['name']} v{meta['version']} ({meta['format']}) as {role} in {version_dir}")
+    if args.onnx:
+        export_onnx(model, version_dir / "model.onnx")
+        print(f"✅ Exported ONNX model to {version_dir / 'model.onnx'}")
@@ -0,0 +1,179 @@
+"""
+model_registry.py
+-----------------
+On-disk registry of named, versioned XGBoost model artifacts.
+
+Layout under the registry root:
+
+    <name>/v<version>/model.<ubj|json>   native XGBoost serialization
+    <name>/v<version>/meta.json          version, format, timestamps, extras
+    <name>/aliases.json                  {"primary": 3, "shadow": 4, ...}
+
+A version directory is written under a temporary name and renamed into
+place, so it either exists complete or not at all. The rename also claims
+the version number, so two writers never produce the same version. Aliases
+name the roles a version plays: `primary` is served, `shadow` is scored
+alongside it for validation.
+"""
+
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+from pathlib import Path
+
+import xgboost
+from xgboost import XGBClassifier
+
+# ---------------------------------------------------------------------------
+# Constants
+# ---------------------------------------------------------------------------
+
+PRIMARY_ALIAS = "primary"
+SHADOW_ALIAS = "shadow"
+
+# Native serializations; XGBoost picks the serializer from the file extension
+MODEL_FORMATS = ("ubj", "json")
+
+META_FILE = "meta.json"
+ALIASES_FILE = "aliases.json"
+
+
+# ---------------------------------------------------------------------------
+# Helper — atomic writes
+# ---------------------------------------------------------------------------
+
+def _write_json(path: Path, payload: dict):
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(json.dumps(payload, indent=2))
+    os.replace(tmp, path)
+
+
+# ---------------------------------------------------------------------------
+# Registry
+# ---------------------------------------------------------------------------
+
+class ModelRegistry:
+    """Versioned model artifacts and role aliases under one root directory."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def version_dir(self, name: str, version: int) -> Path:
+        return self.root / name / f"v{version}"
+
+    def names(self) -> list:
+        if not self.root.is_dir():
+            return []
+        return sorted(path.name for path in self.root.iterdir() if path.is_dir())
+
+    def versions(self, name: str) -> list:
+        """Registered versions of `name`, ascending."""
+        model_root = self.root / name
+        if not model_root.is_dir():
+            return []
+        return sorted(
+            int(path.name[1:])
+            for path in model_root.iterdir()
+            if path.name.startswith("v") and path.name[1:].isdigit() and (path / META_FILE).exists()
+        )
+
+    def metadata(self, name: str, version: int) -> dict | None:
+        path = self.version_dir(name, version) / META_FILE
+        if not path.exists():
+            return None
+        return json.loads(path.read_text())
+
+    def register(self, model: XGBClassifier, name: str, fmt: str = "ubj",
+                 metadata: dict | None = None, aliases=()) -> dict:
+        """
+        Store `model` as the next version of `name` and point `aliases` at it.
+
+        Returns:
+            dict: The metadata written next to the artifact.
+
+        Raises:
+            ValueError: If `fmt` is not one of MODEL_FORMATS.
+        """
+        if fmt not in MODEL_FORMATS:
+            raise ValueError(f"Unsupported model format {fmt!r}; expected one of {MODEL_FORMATS}")
+        model_root = self.root / name
+        model_root.mkdir(parents=True, exist_ok=True)
+        staging = model_root / f".staging-{os.getpid()}-{id(model)}"
+        if staging.exists():
+            shutil.rmtree(staging)
+        staging.mkdir()
+
+        version = (self.versions(name) or [0])[-1] + 1
+        meta = {
+            **(metadata or {}),
+            "name": name,
+            "version": version,
+            "format": fmt,
+            "xgboost_version": xgboost.__version__,
+            "trained_at": datetime.now(timezone.utc).isoformat(),
+        }
+        # The final file name, so the extension selects the right serializer
+        model.save_model(staging / f"model.{fmt}")
+        while True:
+            meta["version"] = version
+            _write_json(staging / META_FILE, meta)
+            try:
+                os.rename(staging, self.version_dir(name, version))
+                break
+            except OSError:
+                # Another writer claimed this version first
+                if not self.version_dir(name, version).exists():
+                    shutil.rmtree(staging, ignore_errors=True)
+                    raise
+                version += 1
+
+        for alias in aliases:
+            self.set_alias(name, alias, version)
+        return meta
+
+    def load(self, name: str, version: int | None = None, alias: str | None = None) -> tuple:
+        """
+        Load a version of `name`: the given `version`, else the version
+        `alias` points to, else the latest.
+
+        Returns:
+            Tuple of (XGBClassifier, metadata dict), or (None, None) if there
+            is no such version.
+        """
+        if version is None and alias is not None:
+            version = self.aliases(name).get(alias)
+        if version is None:
+            version = (self.versions(name) or [None])[-1]
+        meta = None if version is None else self.metadata(name, version)
+        if meta is None:
+            return None, None
+        model = XGBClassifier()
+        model.load_model(self.version_dir(name, version) / f"model.{meta['format']}")
+        return model, meta
+
+    def aliases(self, name: str) -> dict:
+        path = self.root / name / ALIASES_FILE
+        if not path.exists():
+            return {}
+        return json.loads(path.read_text())
+
+    def set_alias(self, name: str, alias: str, version: int | None):
+        """Point `alias` at `version` (None removes the alias)."""
+        if version is not None and self.metadata(name, version) is None:
+            raise KeyError(f"{name} v{version} is not registered")
+        aliases = self.aliases(name)
+        if version is None:
+            aliases.pop(alias, None)
+        else:
+            aliases[alias] = version
+        (self.root / name).mkdir(parents=True, exist_ok=True)
+        _write_json(self.root / name / ALIASES_FILE, aliases)
+
+    def describe(self, name: str) -> dict:
+        """Metadata of every version of `name` plus its aliases."""
+        return {
+            "name": name,
+            "aliases": self.aliases(name),
+            "versions": [self.metadata(name, version) for version in self.versions(name)],
+        }
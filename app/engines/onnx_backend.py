@@ -0,0 +1,105 @@
+"""
+onnx_backend.py
+---------------
+ONNX export of the root-cause classifier and an onnxruntime scorer for it.
+
+onnxruntime's CPU session has a much smaller per-call cost than XGBoost for
+the tiny batches served per request, and one session can be shared by every
+thread. A session is only used after a parity check against XGBoost on a
+synthetic batch; a model that disagrees is rejected.
+
+onnxruntime and onnxmltools are optional: they are imported only when the
+backend is used.
+"""
+
+import numpy as np
+from xgboost import XGBClassifier
+
+from app.engines.inference import FEATURE_COLUMNS, FEATURE_LOWER, FEATURE_UPPER
+
+# ---------------------------------------------------------------------------
+# Constants
+# ---------------------------------------------------------------------------
+
+ONNX_INPUT_NAME = "features"
+ONNX_PROBABILITY_OUTPUT = "probabilities"
+ONNX_TARGET_OPSET = 15
+
+# Largest |p_onnx - p_xgboost| accepted by the load-time parity check
+ONNX_PARITY_ATOL = 1e-5
+ONNX_PARITY_ROWS = 1000
+
+
+# ---------------------------------------------------------------------------
+# Export
+# ---------------------------------------------------------------------------
+
+def export_onnx(model: XGBClassifier, path=None) -> bytes:
+    """
+    Convert `model` to an ONNX graph taking a float32 ``(n, 5)`` input named
+    ONNX_INPUT_NAME; optionally also write it to `path`.
+    """
+    try:
+        from onnxmltools import convert_xgboost
+        from onnxmltools.convert.common.data_types import FloatTensorType
+    except ImportError as exc:
+        raise ImportError("ONNX export needs onnxmltools: pip install onnxmltools onnxruntime") from exc
+
+    # The converter only understands positional (f0, f1, ...) feature names
+    anonymous = XGBClassifier()
+    anonymous.load_model(bytearray(model.get_booster().save_raw(raw_format="ubj")))
+    anonymous.get_booster().feature_names = None
+
+    onnx_model = convert_xgboost(
+        anonymous,
+        initial_types=[(ONNX_INPUT_NAME, FloatTensorType([None, len(FEATURE_COLUMNS)]))],
+        target_opset=ONNX_TARGET_OPSET,
+    )
+    payload = onnx_model.SerializeToString()
+    if path is not None:
+        with open(path, "wb") as handle:
+            handle.write(payload)
+    return payload
+
+
+# ---------------------------------------------------------------------------
+# Scorer
+# ---------------------------------------------------------------------------
+
+class OnnxScorer:
+    """Thread-safe onnxruntime CPU session returning positive-class probabilities."""
+
+    def __init__(self, payload: bytes):
+        try:
+            import onnxruntime
+        except ImportError as exc:
+            raise ImportError("The ONNX backend needs onnxruntime: pip install onnxruntime") from exc
+        self.session = onnxruntime.InferenceSession(payload, providers=["CPUExecutionProvider"])
+        self.nbytes = len(payload)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32)
+        (probabilities,) = self.session.run([ONNX_PROBABILITY_OUTPUT], {ONNX_INPUT_NAME: X})
+        return probabilities[:, 1]
+
+
+def parity_error(scorer: OnnxScorer, booster, rows: int = ONNX_PARITY_ROWS) -> float:
+    """Largest probability difference between `scorer` and `booster` on a synthetic batch."""
+    X = np.random.default_rng(0).uniform(FEATURE_LOWER, FEATURE_UPPER, size=(rows, len(FEATURE_COLUMNS)))
+    X = X.astype(np.float32)
+    return float(np.max(np.abs(scorer.predict_proba(X) - booster.inplace_predict(X))))
+
+
+def load_onnx_scorer(model: XGBClassifier, atol: float = ONNX_PARITY_ATOL) -> OnnxScorer:
+    """
+    Export `model`, open an onnxruntime session and verify it against XGBoost.
+
+    Raises:
+        ValueError: If the session's predictions differ by more than `atol`.
+    """
+    scorer = OnnxScorer(export_onnx(model))
+    error = parity_error(scorer, model.get_booster())
+    if error > atol:
+        raise ValueError(f"ONNX model disagrees with XGBoost (max |Δp| {error:.2e} > {atol:.0e})")
+    scorer.parity_error = error
+    return scorer
@@ -0,0 +1,137 @@
+"""
+prediction_cache.py
+-------------------
+Memoizes root-cause probabilities per service row.
+
+The dashboard re-posts the same telemetry on every refresh, so most rows
+of a batch were already scored by the same model. Rows are keyed on the
+model generation plus the capped feature vector quantized to a fixed
+fraction of each feature's range. Only the rows that miss are sent to the
+model, and those go in one call. Entries live in a bounded LRU with a TTL,
+and a newly installed model starts with an empty cache.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from app.engines.inference import FEATURE_LOWER, FEATURE_UPPER
+
+# ---------------------------------------------------------------------------
+# Constants
+# ---------------------------------------------------------------------------
+
+# Maximum cached rows (0 disables the cache)
+PREDICTION_CACHE_SIZE = int(os.environ.get("KAIROS_PREDICTION_CACHE_SIZE", "10000"))
+
+# Seconds a cached probability stays valid
+PREDICTION_CACHE_TTL_SECONDS = float(os.environ.get("KAIROS_PREDICTION_CACHE_TTL_SECONDS", "300"))
+
+# Quantization step as a fraction of each feature's capped range
+PREDICTION_CACHE_QUANTUM = float(os.environ.get("KAIROS_PREDICTION_CACHE_QUANTUM", "1e-4"))
+
+
+# ---------------------------------------------------------------------------
+# Helper — keys
+# ---------------------------------------------------------------------------
+
+def quantized_keys(X: np.ndarray, quantum: float = PREDICTION_CACHE_QUANTUM) -> list:
+    """One hashable key (the quantized row as bytes) per row of capped `X`."""
+    scale = 1.0 / (quantum * (FEATURE_UPPER - FEATURE_LOWER))
+    grid = np.rint((X - FEATURE_LOWER) * scale)
+    # Missing values get their own bucket below the capped range
+    grid = np.nan_to_num(grid, nan=-1.0).astype(np.int64)
+    return np.ascontiguousarray(grid).view(np.dtype((np.void, grid.shape[1] * 8))).ravel().tolist()
+
+
+# ---------------------------------------------------------------------------
+# Cache
+# ---------------------------------------------------------------------------
+
+class PredictionCache:
+    """Thread-safe LRU + TTL map from (model generation, row key) to probability."""
+
+    def __init__(self, max_entries: int = PREDICTION_CACHE_SIZE,
+                 ttl_seconds: float = PREDICTION_CACHE_TTL_SECONDS,
+                 quantum: float = PREDICTION_CACHE_QUANTUM):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.quantum = quantum
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def keys(self, generation: int, X: np.ndarray) -> list:
+        return [(generation, key) for key in quantized_keys(X, self.quantum)]
+
+    # Hooks for subclasses caching other values than probabilities
+
+    def _missing_values(self, count: int):
+        """Result container for `count` lookups; misses keep its fill value."""
+        return np.full(count, np.nan)
+
+    def _entry_value(self, value):
+        return float(value)
+
+    def lookup(self, keys: list) -> tuple:
+        """
+        Returns:
+            Tuple of (cached values with the `_missing_values` fill, NaN for
+            probabilities, at the misses; indices of the misses).
+        """
+        probs = self._missing_values(len(keys))
+        missing = []
+        now = time.monotonic()
+        with self._lock:
+            for i, key in enumerate(keys):
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] < now:
+                    del self._entries[key]
+                    self.expirations += 1
+                    entry = None
+                if entry is None:
+                    missing.append(i)
+                    continue
+                self._entries.move_to_end(key)
+                probs[i] = entry[0]
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+        return probs, missing
+
+    def store(self, keys: list, probs):
+        expires = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            for key, prob in zip(keys, probs):
+                self._entries[key] = (self._entry_value(prob), expires)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
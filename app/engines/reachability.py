@@ -0,0 +1,196 @@
+"""
+reachability.py
+---------------
+Precomputed reachability index for the service dependency graph.
+
+The graph is collapsed into its strongly connected components (so cyclic
+service meshes are handled correctly) and the transitive closure of the
+resulting DAG is stored as one bitset per component. Python integers are used
+as arbitrary-width bitsets: bit ``i`` is set when service ``i`` is reachable.
+
+Once built (once per topology version), blast-radius counts are O(1) lookups
+and descendant sets are a single bitset decode.
+"""
+
+import sys
+
+
+# ---------------------------------------------------------------------------
+# Helper — strongly connected components
+# ---------------------------------------------------------------------------
+
+def _strongly_connected_components(node_count: int, successors: list) -> list:
+    """
+    Iterative Tarjan's algorithm.
+
+    Returns a list of components (lists of node ids) in reverse topological
+    order: every component appears after all components reachable from it.
+    """
+    index_of = [-1] * node_count
+    lowlink = [0] * node_count
+    on_stack = [False] * node_count
+    stack = []
+    components = []
+    counter = 0
+
+    for root in range(node_count):
+        if index_of[root] != -1:
+            continue
+        work = [(root, iter(successors[root]))]
+        index_of[root] = lowlink[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+
+        while work:
+            node, children = work[-1]
+            advanced = False
+            for child in children:
+                if index_of[child] == -1:
+                    index_of[child] = lowlink[child] = counter
+                    counter += 1
+                    stack.append(child)
+                    on_stack[child] = True
+                    work.append((child, iter(successors[child])))
+                    advanced = True
+                    break
+                if on_stack[child]:
+                    lowlink[node] = min(lowlink[node], index_of[child])
+            if advanced:
+                continue
+
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[node])
+            if lowlink[node] == index_of[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = False
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+
+    return components
+
+
+# ---------------------------------------------------------------------------
+# Public index
+# ---------------------------------------------------------------------------
+
+class ReachabilityIndex:
+    """SCC condensation plus bitset transitive closure over integer node ids."""
+
+    def __init__(self, node_count: int, successors: list):
+        """
+        Parameters
+        ----------
+        node_count : int
+            Number of nodes; ids are ``0 .. node_count - 1``.
+        successors : list of iterables
+            ``successors[i]`` yields the ids of the services ``i`` depends on.
+        """
+        self.node_count = node_count
+        components = _strongly_connected_components(node_count, successors)
+
+        self._component_of = [0] * node_count
+        members = []
+        for comp_id, component in enumerate(components):
+            mask = 0
+            for node in component:
+                self._component_of[node] = comp_id
+                mask |= 1 << node
+            members.append(mask)
+
+        # Components arrive in reverse topological order, so each successor's
+        # closure is final before it is needed.
+        self._closure = [0] * len(components)
+        for comp_id, component in enumerate(components):
+            reach = 0
+            for node in component:
+                for child in successors[node]:
+                    child_comp = self._component_of[child]
+                    if child_comp != comp_id:
+                        reach |= self._closure[child_comp] | members[child_comp]
+            self._closure[comp_id] = reach
+
+        self._members = members
+        self._cyclic = [
+            len(component) > 1
+            or any(child == component[0] for child in successors[component[0]])
+            for component in components
+        ]
+        self._blast_radius = [
+            self._closure[comp_id].bit_count() + len(components[comp_id]) - 1
+            for comp_id in self._component_of
+        ]
+        self._nbytes = None
+
+    def with_isolated(self, count: int) -> "ReachabilityIndex":
+        """
+        Index for this graph plus `count` isolated nodes appended after the
+        existing ids. They reach nothing and nothing reaches them, so every
+        existing bitset is shared unchanged.
+        """
+        index = object.__new__(ReachabilityIndex)
+        first_node, first_comp = self.node_count, len(self._closure)
+        index.node_count = self.node_count + count
+        index._component_of = self._component_of + list(range(first_comp, first_comp + count))
+        index._closure = self._closure + [0] * count
+        index._members = self._members + [1 << node for node in range(first_node, first_node + count)]
+        index._cyclic = self._cyclic + [False] * count
+        index._blast_radius = self._blast_radius + [0] * count
+        index._nbytes = None
+        return index
+
+    @classmethod
+    def from_topology(cls, topology):
+        """Build an index over a compiled CSR Topology, using its service ids."""
+        return cls(len(topology), topology.successor_lists())
+
+    @classmethod
+    def from_graph(cls, graph):
+        """Build an index from a NetworkX DiGraph; returns ``(index, nodes)``."""
+        nodes = list(graph.nodes())
+        position = {node: i for i, node in enumerate(nodes)}
+        successors = [[position[child] for child in graph.successors(node)] for node in nodes]
+        return cls(len(nodes), successors), nodes
+
+    def _descendant_mask(self, node: int) -> int:
+        comp_id = self._component_of[node]
+        return self._closure[comp_id] | (self._members[comp_id] & ~(1 << node))
+
+    def blast_radius(self, node: int) -> int:
+        """Number of services reachable from ``node`` (excluding itself)."""
+        return self._blast_radius[node]
+
+    def blast_radii(self) -> list:
+        """Blast radius of every node, indexed by node id."""
+        return list(self._blast_radius)
+
+    def descendants(self, node: int) -> list:
+        """Ids of every service reachable from ``node`` (excluding itself)."""
+        mask = self._descendant_mask(node)
+        result = []
+        while mask:
+            low = mask & -mask
+            result.append(low.bit_length() - 1)
+            mask ^= low
+        return result
+
+    def reaches(self, source: int, target: int) -> bool:
+        """True if ``target`` is reachable from ``source`` via at least one edge."""
+        if source == target:
+            return self._cyclic[self._component_of[source]]
+        return bool(self._descendant_mask(source) >> target & 1)
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the bitsets and per-node lookups (computed once)."""
+        if self._nbytes is None:
+            bitsets = sum(sys.getsizeof(mask) for mask in self._closure)
+            bitsets += sum(sys.getsizeof(mask) for mask in self._members)
+            lookups = 8 * (len(self._component_of) + len(self._blast_radius) + len(self._cyclic))
+            self._nbytes = bitsets + lookups
+        return self._nbytes
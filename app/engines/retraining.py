@@ -0,0 +1,205 @@
+"""
+retraining.py
+-------------
+Background retraining of the root-cause model.
+
+A retrain is submitted as a job and fitted in a separate worker process, so
+neither the event loop nor the serving threads wait on XGBoost. The worker
+persists the new artifact as the next version. When it finishes, the parent
+loads that artifact and publishes it with `ml_model.install_model`, a single
+reference swap. Until then every request keeps scoring with the old model.
+Only one retrain runs at a time; submitting while one is in flight returns
+the running job.
+
+Progress is the number of boosting rounds completed so far. An XGBoost
+callback in the worker increments a counter in shared memory, which the
+parent reads when the job's status is requested.
+"""
+
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from xgboost.callback import TrainingCallback
+
+from app.engines import ml_model
+from app.engines.shard_training import TRAINING_ROUNDS
+
+# ---------------------------------------------------------------------------
+# Constants
+# ---------------------------------------------------------------------------
+
+# Finished jobs kept for the status endpoint
+MAX_RETRAIN_JOBS = int(os.environ.get("KAIROS_MAX_RETRAIN_JOBS", "50"))
+
+# Job states
+RUNNING, SUCCEEDED, FAILED = "running", "succeeded", "failed"
+
+# Boosting rounds completed by the running retrain. Shared with the worker
+# process when it starts; one counter suffices since one retrain runs at a time.
+_rounds_completed = multiprocessing.get_context("spawn").Value("i", 0)
+
+
+# ---------------------------------------------------------------------------
+# Helper — worker side
+# ---------------------------------------------------------------------------
+
+class _RoundCounter(TrainingCallback):
+    """Counts boosting rounds into the shared progress counter."""
+
+    def after_iteration(self, model, epoch, evals_log) -> bool:
+        with _rounds_completed.get_lock():
+            _rounds_completed.value += 1
+        return False
+
+
+def _init_worker(rounds_completed):
+    # Shared memory can only reach a spawned process at start-up
+    global _rounds_completed
+    _rounds_completed = rounds_completed
+
+
+def _train_in_worker(directory, fmt) -> dict:
+    """Runs in the worker process: fit, persist, and return the new metadata."""
+    _, meta = ml_model.retrain_and_save(directory, fmt, callbacks=[_RoundCounter()])
+    return meta
+
+
+def _default_executor():
+    # "spawn" keeps the worker clear of the parent's XGBoost/OpenMP thread state
+    return ProcessPoolExecutor(
+        max_workers=1, mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker, initargs=(_rounds_completed,),
+    )
+
+
+# ---------------------------------------------------------------------------
+# Jobs
+# ---------------------------------------------------------------------------
+
+class RetrainJob:
+    """Status and boosting progress of one background retrain."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, previous_version: int):
+        self.id = next(self._ids)
+        self.status = RUNNING
+        self.previous_version = previous_version
+        self.model_version = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self.total_rounds = TRAINING_ROUNDS
+        self._rounds_completed = 0
+
+    @property
+    def done(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED)
+
+    @property
+    def rounds_completed(self) -> int:
+        # Live from the worker while running, frozen once finished
+        if self.status == RUNNING:
+            return _rounds_completed.value
+        return self._rounds_completed
+
+    def _finished(self, status: str, error: str | None = None):
+        self._rounds_completed = _rounds_completed.value
+        self.error = error
+        self.finished_at = time.time()
+        self.status = status
+
+    def to_json(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "previous_version": self.previous_version,
+            "model_version": self.model_version,
+            "rounds_completed": self.rounds_completed,
+            "total_rounds": self.total_rounds,
+            "error": self.error,
+            "submitted_at": self.submitted_at,
+            "finished_at": self.finished_at,
+            "elapsed_seconds": round((self.finished_at or time.time()) - self.submitted_at, 3),
+        }
+
+
+class RetrainManager:
+    """Submits retrain jobs to a worker pool and installs their results."""
+
+    def __init__(self, executor=None, directory=None, fmt: str | None = None,
+                 max_jobs: int = MAX_RETRAIN_JOBS):
+        self.directory = directory
+        self.fmt = fmt
+        self.max_jobs = max_jobs
+        self._executor = executor
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._active = None
+
+    def submit(self) -> RetrainJob:
+        """Start a retrain, or return the one already in flight."""
+        with self._lock:
+            if self._active is not None and not self._active.done:
+                return self._active
+            if self._executor is None:
+                self._executor = _default_executor()
+
+            _rounds_completed.value = 0
+            job = RetrainJob(ml_model.model_version())
+            try:
+                future = self._submit_to_worker()
+            except Exception as exc:
+                job._finished(FAILED, f"{type(exc).__name__}: {exc}")
+                raise
+
+            # Only a job that actually reached a worker becomes the active one
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+            self._active = job
+            future.add_done_callback(lambda f: self._finish(job, f))
+            return job
+
+    def _submit_to_worker(self):
+        """Submit the training call; a pool whose worker died is replaced once. Caller holds the lock."""
+        try:
+            return self._executor.submit(_train_in_worker, self.directory, self.fmt)
+        except BrokenProcessPool:
+            print("⚠️ Retrain worker pool is broken, starting a new one")
+            self._executor.shutdown(wait=False)
+            self._executor = _default_executor()
+            return self._executor.submit(_train_in_worker, self.directory, self.fmt)
+
+    def _finish(self, job: RetrainJob, future):
+        try:
+            meta = future.result()
+            model, meta = ml_model.load_model(self.directory, version=meta["version"])
+            ml_model.install_model(model, meta)
+            job.model_version = meta["version"]
+            job._finished(SUCCEEDED)
+        except Exception as exc:
+            job._finished(FAILED, f"{type(exc).__name__}: {exc}")
+
+    def get(self, job_id: int) -> RetrainJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def wait(self, job: RetrainJob, timeout: float | None = None) -> bool:
+        """Block until `job` finishes (for scripts and tests); True if it did."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not job.done:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+
+# Process-wide manager used by the API
+retrain_manager = RetrainManager()
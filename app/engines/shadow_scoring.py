@@ -0,0 +1,125 @@
+"""
+shadow_scoring.py
+-----------------
+Scores a candidate ("shadow") model on live traffic without touching the
+response path.
+
+After the primary model has scored a batch, the same capped feature matrix is
+handed to a background worker. The worker scores it with the shadow model
+and records both results: the latest comparisons, plus running agreement
+statistics (mean and max absolute difference, top-suspect agreement). If
+the worker falls behind, new batches are dropped and counted rather than
+queued without bound.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# ---------------------------------------------------------------------------
+# Constants
+# ---------------------------------------------------------------------------
+
+# Batches allowed to wait for the shadow worker before new ones are dropped
+MAX_PENDING_SHADOW_BATCHES = int(os.environ.get("KAIROS_MAX_PENDING_SHADOW_BATCHES", "8"))
+
+# Recent comparisons kept for inspection
+SHADOW_LOG_SIZE = int(os.environ.get("KAIROS_SHADOW_LOG_SIZE", "100"))
+
+
+# ---------------------------------------------------------------------------
+# Scorer
+# ---------------------------------------------------------------------------
+
+class ShadowScorer:
+    """Background comparison of a shadow model against the primary."""
+
+    def __init__(self, executor=None, max_pending: int = MAX_PENDING_SHADOW_BATCHES,
+                 log_size: int = SHADOW_LOG_SIZE):
+        self.max_pending = max_pending
+        self.log = deque(maxlen=log_size)
+        self._executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Zero the comparison counters, atomically with respect to the worker."""
+        with self._lock:
+            self.batches = 0
+            self.rows = 0
+            self.dropped = 0
+            self.errors = 0
+            self.top_agreements = 0
+            self._abs_diff_sum = 0.0
+            self.max_abs_diff = 0.0
+
+    def submit(self, shadow, X: np.ndarray, primary_probs: np.ndarray,
+               primary_version: int, labels=None) -> bool:
+        """
+        Queue one batch for shadow scoring. `X` is copied, so the caller's
+        buffer can be reused immediately.
+
+        Returns:
+            bool: False if the batch was dropped because the worker is behind.
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.dropped += 1
+                return False
+            self._pending += 1
+        self._executor.submit(
+            self._score, shadow, X.copy(), np.array(primary_probs, dtype=np.float64),
+            primary_version, list(labels) if labels is not None else None,
+        )
+        return True
+
+    def _score(self, shadow, X, primary_probs, primary_version, labels):
+        try:
+            shadow_probs = np.asarray(shadow.booster.inplace_predict(X), dtype=np.float64)
+            diff = np.abs(shadow_probs - primary_probs)
+            agree = bool(np.argmax(shadow_probs) == np.argmax(primary_probs))
+            with self._lock:
+                self.batches += 1
+                self.rows += len(X)
+                self.top_agreements += agree
+                self._abs_diff_sum += float(diff.sum())
+                self.max_abs_diff = max(self.max_abs_diff, float(diff.max()))
+                self.log.append({
+                    "timestamp": time.time(),
+                    "primary_version": primary_version,
+                    "shadow_version": shadow.version,
+                    "services": labels,
+                    "primary": primary_probs.round(4).tolist(),
+                    "shadow": shadow_probs.round(4).tolist(),
+                    "top_suspect_agrees": agree,
+                })
+            print(
+                f"🕶️ Shadow v{shadow.version} vs primary v{primary_version}: "
+                f"max |Δp| {diff.max():.4f}, top suspect {'agrees' if agree else 'differs'}"
+            )
+        except Exception as exc:
+            with self._lock:
+                self.errors += 1
+            print(f"⚠️ Shadow scoring failed: {exc}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "rows": self.rows,
+                "dropped": self.dropped,
+                "errors": self.errors,
+                "pending": self._pending,
+                "mean_abs_diff": self._abs_diff_sum / self.rows if self.rows else None,
+                "max_abs_diff": self.max_abs_diff,
+                "top_suspect_agreement": self.top_agreements / self.batches if self.batches else None,
+                "recent": list(self.log)[-10:],
+            }
@@ -0,0 +1,213 @@
+"""
+shard_training.py
+-----------------
+Out-of-core training of the root-cause model from recorded incident history.
+
+Labelled feature rows are streamed from on-disk shards through an
+``xgboost.DataIter``, one bounded batch at a time. They feed either an
+``ExtMemQuantileDMatrix``, which keeps its histogram pages in an on-disk
+cache, or an in-memory ``QuantileDMatrix``. Neither holds the raw history,
+so training memory stays bounded however many months are kept.
+
+Supported shards (columns named by FEATURE_COLUMNS plus LABEL_COLUMN):
+  * ``.npz``     — arrays ``X`` (FEATURE_COLUMNS order) and ``y``, or one
+                   array per column; loaded one shard at a time
+  * ``.csv``     — read in chunks of ``batch_rows``
+  * ``.parquet`` — read in record batches of ``batch_rows`` (needs pyarrow)
+
+Features are capped with the same table as serving. Training can continue
+boosting from a previous model instead of starting over.
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import xgboost
+from xgboost import XGBClassifier
+
+from app.engines.inference import FEATURE_COLUMNS, FEATURE_LOWER, FEATURE_UPPER
+
+# ---------------------------------------------------------------------------
+# Constants
+# ---------------------------------------------------------------------------
+
+LABEL_COLUMN = "target"
+
+SHARD_SUFFIXES = (".npz", ".csv", ".parquet")
+
+# Rows handed to XGBoost per iterator step
+SHARD_BATCH_ROWS = int(os.environ.get("KAIROS_SHARD_BATCH_ROWS", "65536"))
+
+# Keep quantile pages in an on-disk cache instead of RAM
+TRAINING_EXTERNAL_MEMORY = os.environ.get("KAIROS_TRAINING_EXTERNAL_MEMORY", "1") == "1"
+
+# Same model shape as the in-memory XGBClassifier(n_estimators=100, random_state=42)
+TRAINING_PARAMS = {
+    "objective": "binary:logistic",
+    "tree_method": "hist",
+    "max_bin": 256,
+    "seed": 42,
+}
+TRAINING_ROUNDS = 100
+
+
+# ---------------------------------------------------------------------------
+# Helper — shard readers
+# ---------------------------------------------------------------------------
+
+def discover_shards(paths) -> list:
+    """Expand files and directories into a sorted list of supported shard files."""
+    shards = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            shards.extend(sorted(p for p in path.rglob("*") if p.suffix in SHARD_SUFFIXES))
+        elif path.suffix in SHARD_SUFFIXES:
+            shards.append(path)
+        else:
+            raise ValueError(f"Unsupported shard {path}; expected one of {SHARD_SUFFIXES}")
+    return shards
+
+
+def _read_npz(path: Path, batch_rows: int):
+    with np.load(path) as data:
+        if "X" in data:
+            X, y = data["X"], data["y"]
+        else:
+            X = np.column_stack([data[column] for column in FEATURE_COLUMNS])
+            y = data[LABEL_COLUMN]
+    for start in range(0, len(X), batch_rows):
+        yield X[start:start + batch_rows], y[start:start + batch_rows]
+
+
+def _read_csv(path: Path, batch_rows: int):
+    import pandas as pd
+
+    columns = FEATURE_COLUMNS + [LABEL_COLUMN]
+    for chunk in pd.read_csv(path, usecols=columns, chunksize=batch_rows):
+        yield chunk[FEATURE_COLUMNS].to_numpy(np.float64), chunk[LABEL_COLUMN].to_numpy()
+
+
+def _read_parquet(path: Path, batch_rows: int):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as exc:
+        raise ImportError("Parquet shards need pyarrow: pip install pyarrow") from exc
+
+    columns = FEATURE_COLUMNS + [LABEL_COLUMN]
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_rows, columns=columns):
+        X = np.column_stack([batch.column(column).to_numpy() for column in FEATURE_COLUMNS])
+        yield X.astype(np.float64), batch.column(LABEL_COLUMN).to_numpy()
+
+
+_READERS = {".npz": _read_npz, ".csv": _read_csv, ".parquet": _read_parquet}
+
+
+def read_shard(path, batch_rows: int = SHARD_BATCH_ROWS):
+    """Yield capped ``(X, y)`` batches of at most `batch_rows` rows from one shard."""
+    path = Path(path)
+    for X, y in _READERS[path.suffix](path, batch_rows):
+        X = np.clip(np.asarray(X, dtype=np.float64), FEATURE_LOWER, FEATURE_UPPER)
+        yield X, np.asarray(y, dtype=np.float32)
+
+
+# ---------------------------------------------------------------------------
+# Iterator
+# ---------------------------------------------------------------------------
+
+class ShardIterator(xgboost.DataIter):
+    """Streams every batch of every shard to XGBoost, one at a time."""
+
+    def __init__(self, shards: list, batch_rows: int = SHARD_BATCH_ROWS, cache_prefix: str | None = None):
+        self.shards = list(shards)
+        self.batch_rows = batch_rows
+        self.rows = 0
+        self._batches = None
+        super().__init__(cache_prefix=cache_prefix)
+
+    def _all_batches(self):
+        for shard in self.shards:
+            yield from read_shard(shard, self.batch_rows)
+
+    def next(self, input_data) -> bool:
+        if self._batches is None:
+            self._batches = self._all_batches()
+            self.rows = 0
+        batch = next(self._batches, None)
+        if batch is None:
+            return False
+        X, y = batch
+        self.rows += len(X)
+        input_data(data=X, label=y, feature_names=FEATURE_COLUMNS)
+        return True
+
+    def reset(self):
+        self._batches = None
+
+
+# ---------------------------------------------------------------------------
+# Public entry-point
+# ---------------------------------------------------------------------------
+
+def train_from_shards(
+    paths,
+    init_model=None,
+    num_boost_round: int = TRAINING_ROUNDS,
+    params: dict | None = None,
+    external_memory: bool = TRAINING_EXTERNAL_MEMORY,
+    batch_rows: int = SHARD_BATCH_ROWS,
+    cache_dir=None,
+    callbacks=None,
+) -> tuple:
+    """
+    Train (or continue training) the root-cause classifier from shards.
+
+    Parameters
+    ----------
+    paths : iterable of paths
+        Shard files and/or directories containing them.
+    init_model : XGBClassifier or Booster, optional
+        Continue boosting from this model; `num_boost_round` trees are added.
+    external_memory : bool
+        Page quantile data to an on-disk cache (ExtMemQuantileDMatrix)
+        instead of holding it in RAM (QuantileDMatrix).
+    cache_dir : path, optional
+        Where external-memory pages go (a temporary directory by default).
+    callbacks : list of xgboost.callback.TrainingCallback, optional
+        Called after every boosting round (e.g. to report progress).
+
+    Returns
+    -------
+    tuple
+        (XGBClassifier, training summary dict for the model metadata)
+    """
+    shards = discover_shards(paths)
+    if not shards:
+        raise ValueError("No training shards found")
+    params = {**TRAINING_PARAMS, **(params or {})}
+    init_booster = init_model.get_booster() if isinstance(init_model, XGBClassifier) else init_model
+
+    with tempfile.TemporaryDirectory(dir=cache_dir) as tmp:
+        if external_memory:
+            iterator = ShardIterator(shards, batch_rows, cache_prefix=os.path.join(tmp, "shards"))
+            dtrain = xgboost.ExtMemQuantileDMatrix(iterator, max_bin=params["max_bin"])
+        else:
+            iterator = ShardIterator(shards, batch_rows)
+            dtrain = xgboost.QuantileDMatrix(iterator, max_bin=params["max_bin"])
+        booster = xgboost.train(
+            params, dtrain, num_boost_round=num_boost_round, xgb_model=init_booster, callbacks=callbacks
+        )
+        del dtrain
+
+    model = XGBClassifier()
+    model.load_model(bytearray(booster.save_raw(raw_format="ubj")))
+    summary = {
+        "source": "shards",
+        "shards": len(shards),
+        "rows": iterator.rows,
+        "rounds": booster.num_boosted_rounds(),
+        "continued": init_booster is not None,
+        "external_memory": external_memory,
+    }
+    return model, summary
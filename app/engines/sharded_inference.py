@@ -0,0 +1,178 @@
+"""
+sharded_inference.py
+--------------------
+Multi-core scoring of very large fleets.
+
+A large feature matrix is split into row shards, which are scored
+concurrently on a thread pool. ``Booster.inplace_predict`` is thread-safe and
+releases the GIL, so threads use every core without pickling the matrix
+across processes. The results are written back in row order.
+
+How many XGBoost threads each call uses, how many rows go in a shard and how
+many shards run at once depends on the machine and on the batch size. Small
+per-request batches (below ``SHARDED_MIN_ROWS``) are dominated by thread
+start-up cost and get their own configuration. `autotune` times the candidate
+configurations on a synthetic fleet and on a request-sized batch and keeps the
+fastest of each; it only runs at start-up when KAIROS_AUTOTUNE_INFERENCE=1.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app.engines.inference import FEATURE_COLUMNS, FEATURE_LOWER, FEATURE_UPPER
+
+# ---------------------------------------------------------------------------
+# Constants
+# ---------------------------------------------------------------------------
+
+CPU_COUNT = os.cpu_count() or 1
+
+# Batches smaller than this are never sharded
+SHARDED_MIN_ROWS = int(os.environ.get("KAIROS_SHARDED_MIN_ROWS", "4096"))
+
+# Shard sizes tried by the auto-tuner
+AUTOTUNE_SHARD_ROWS = (2048, 8192, 32768)
+
+# Synthetic fleet size and repetitions used for tuning
+AUTOTUNE_ROWS = int(os.environ.get("KAIROS_AUTOTUNE_ROWS", "50000"))
+AUTOTUNE_REPEATS = 3
+
+# Request-sized batch and repetitions used to tune the small-batch configuration
+AUTOTUNE_SMALL_ROWS = 8
+AUTOTUNE_SMALL_REPEATS = 200
+
+
+# ---------------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------------
+
+class InferenceConfig:
+    """XGBoost threads per call, rows per shard (0 = no sharding) and shard workers."""
+
+    def __init__(self, nthread: int = CPU_COUNT, shard_rows: int = 0, workers: int = 1):
+        self.nthread = nthread
+        self.shard_rows = shard_rows
+        self.workers = workers
+        self.seconds = None
+
+    def to_json(self) -> dict:
+        return {
+            "nthread": self.nthread,
+            "shard_rows": self.shard_rows,
+            "workers": self.workers,
+            "tuned_seconds": self.seconds,
+        }
+
+
+def candidate_configs(cpu_count: int = CPU_COUNT) -> list:
+    """Every (nthread, shard_rows, workers) combination worth timing."""
+    nthreads = sorted({1, cpu_count} | {2 ** i for i in range(cpu_count.bit_length()) if 2 ** i <= cpu_count})
+    candidates = [InferenceConfig(nthread, 0, 1) for nthread in nthreads]
+    for nthread in nthreads:
+        workers = cpu_count // nthread
+        if workers > 1:
+            candidates.extend(InferenceConfig(nthread, rows, workers) for rows in AUTOTUNE_SHARD_ROWS)
+    return candidates
+
+
+# ---------------------------------------------------------------------------
+# Scorer
+# ---------------------------------------------------------------------------
+
+class ShardedScorer:
+    """Scores large matrices shard by shard on a shared thread pool."""
+
+    def __init__(self, config: InferenceConfig | None = None, min_rows: int = SHARDED_MIN_ROWS,
+                 small_config: InferenceConfig | None = None):
+        self.config = config or InferenceConfig()
+        # Below `min_rows` one XGBoost thread is usually fastest; tuned by `autotune`
+        self.small_config = small_config or InferenceConfig(nthread=1)
+        self.min_rows = min_rows
+        # Guards creating and replacing the pool, and submitting to it
+        self._pool_lock = threading.Lock()
+        self._executor = None
+        self._executor_workers = 0
+
+    def _pool(self, workers: int) -> ThreadPoolExecutor:
+        # Caller holds self._pool_lock. Shards already submitted to a replaced
+        # pool still run: shutdown(wait=False) only refuses new submissions.
+        if self._executor is None or self._executor_workers < workers:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="shard")
+            self._executor_workers = workers
+        return self._executor
+
+    def config_for(self, rows: int) -> InferenceConfig:
+        """Configuration for a batch of `rows` rows."""
+        return self.small_config if rows < self.min_rows else self.config
+
+    def score(self, booster, X: np.ndarray, config: InferenceConfig | None = None) -> np.ndarray:
+        """Positive-class probability of every row of `X`, in order."""
+        config = config or self.config
+        rows = X.shape[0]
+        if config.shard_rows <= 0 or config.workers <= 1 or rows < max(self.min_rows, 2 * config.shard_rows):
+            return booster.inplace_predict(X)
+
+        out = np.empty(rows, dtype=np.float32)
+        starts = range(0, rows, config.shard_rows)
+
+        def score_shard(start):
+            stop = min(start + config.shard_rows, rows)
+            out[start:stop] = booster.inplace_predict(X[start:stop])
+
+        with self._pool_lock:
+            pool = self._pool(config.workers)
+            futures = [pool.submit(score_shard, start) for start in starts]
+        for future in futures:
+            future.result()
+        return out
+
+    def autotune(self, booster, rows: int = AUTOTUNE_ROWS, repeats: int = AUTOTUNE_REPEATS,
+                 candidates: list | None = None) -> InferenceConfig:
+        """
+        Time every candidate configuration on a synthetic fleet of `rows`
+        services and keep the fastest; then time each thread count on a
+        request-sized batch for `small_config`. `booster` itself is not
+        modified.
+        """
+        rng = np.random.default_rng(0)
+        X = rng.uniform(FEATURE_LOWER, FEATURE_UPPER, size=(rows, len(FEATURE_COLUMNS)))
+        candidates = candidates or candidate_configs()
+        self.config = self._fastest(booster, X, candidates, repeats)
+
+        # Sharding never applies below `min_rows`, so only the thread count matters
+        nthreads = sorted({config.nthread for config in candidates})
+        small = [InferenceConfig(nthread, 0, 1) for nthread in nthreads]
+        self.small_config = self._fastest(booster, X[:AUTOTUNE_SMALL_ROWS], small, AUTOTUNE_SMALL_REPEATS)
+        return self.config
+
+    def _fastest(self, booster, X: np.ndarray, candidates: list, repeats: int) -> InferenceConfig:
+        best = None
+        for config in candidates:
+            trial = booster.copy()
+            trial.set_param({"nthread": config.nthread})
+            self.score(trial, X[:1024], config)  # warm-up
+            timings = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                self.score(trial, X, config)
+                timings.append(time.perf_counter() - start)
+            config.seconds = min(timings)
+            if best is None or config.seconds < best.seconds:
+                best = config
+        return best
+
+
+def rank_scores(scores: np.ndarray, labels: list, top_k: int | None = None) -> list:
+    """(label, score) pairs sorted by score descending, optionally only the top `top_k`."""
+    if top_k is not None and top_k < len(scores):
+        order = np.argpartition(-scores, top_k)[:top_k]
+        order = order[np.argsort(-scores[order], kind="stable")]
+    else:
+        order = np.argsort(-scores, kind="stable")
+    return [(labels[i], float(scores[i])) for i in order.tolist()]
@@ -0,0 +1,254 @@
+"""
+topology.py
+-----------
+Loads the service dependency topology and compiles it into a compact,
+array-backed CSR (compressed sparse row) adjacency.
+
+Service names are interned to integer ids ``0 .. N-1``. For service ``i`` the
+ids of the services it depends on are ``indices[indptr[i]:indptr[i + 1]]``; the
+reverse (caller) adjacency is kept alongside for upstream queries.
+
+Sources:
+  1. A JSON or YAML topology file:
+       {"services": ["frontend", ...],
+        "edges": [["frontend", "auth-service"], ...]}
+     Edges may also be {"source": ..., "target": ...} objects.
+  2. A registry directory (local stand-in for a service registry) holding one
+     JSON/YAML file per service: {"name": "frontend", "depends_on": [...]}.
+
+TopologyLoader watches the source's modification time for hot reload.
+"""
+
+import itertools
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+# ---------------------------------------------------------------------------
+# Constants
+# ---------------------------------------------------------------------------
+
+# Topology file or registry directory; the built-in demo edges are used if unset.
+# An "{env}" placeholder selects a separate topology per environment.
+TOPOLOGY_PATH = os.environ.get("KAIROS_TOPOLOGY_PATH")
+
+# Minimum seconds between modification-time checks of the topology source
+TOPOLOGY_POLL_SECONDS = float(os.environ.get("KAIROS_TOPOLOGY_POLL_SECONDS", "5"))
+
+_TOPOLOGY_SUFFIXES = {".json", ".yaml", ".yml"}
+
+# Every compiled Topology gets a new version; topologies are never mutated
+_topology_versions = itertools.count(1)
+
+
+# ---------------------------------------------------------------------------
+# Compiled topology
+# ---------------------------------------------------------------------------
+
+def _compile_csr(node_count: int, sources: np.ndarray, targets: np.ndarray):
+    """Return ``(indptr, indices)`` grouping ``targets`` by ``sources``."""
+    order = np.argsort(sources, kind="stable")
+    indices = targets[order].astype(np.int32)
+    counts = np.bincount(sources, minlength=node_count)
+    indptr = np.zeros(node_count + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    return indptr, indices
+
+
+class Topology:
+    """Immutable CSR adjacency over interned service ids, tagged with a unique version."""
+
+    def __init__(self, services: list, edges: list):
+        """
+        Parameters
+        ----------
+        services : list of str
+            Service names; their positions become the service ids.
+        edges : list of (str, str)
+            Dependency edges (caller -> callee). Duplicates are dropped.
+        """
+        self.version = next(_topology_versions)
+        self.services = list(services)
+        self.ids = {name: i for i, name in enumerate(self.services)}
+
+        pairs = sorted({(self.ids[src], self.ids[dst]) for src, dst in edges})
+        pair_array = np.array(pairs, dtype=np.int32).reshape(-1, 2)
+        sources, targets = pair_array[:, 0], pair_array[:, 1]
+
+        node_count = len(self.services)
+        self.indptr, self.indices = _compile_csr(node_count, sources, targets)
+        self.rev_indptr, self.rev_indices = _compile_csr(node_count, targets, sources)
+
+    @classmethod
+    def from_edges(cls, edges, services=None):
+        """Intern services in first-seen order: listed services, then edge endpoints."""
+        names = {}
+        for name in services or []:
+            names.setdefault(name, None)
+        for src, dst in edges:
+            names.setdefault(src, None)
+            names.setdefault(dst, None)
+        return cls(list(names), list(edges))
+
+    def with_services(self, services):
+        """
+        Return a topology with the given services added as isolated nodes.
+        The edges are not recompiled: the new ids simply get empty CSR rows.
+        """
+        missing = list(dict.fromkeys(name for name in services if name not in self.ids))
+        if not missing:
+            return self
+        topology = object.__new__(Topology)
+        topology.version = next(_topology_versions)
+        topology.services = self.services + missing
+        topology.ids = {**self.ids, **{name: len(self.services) + i for i, name in enumerate(missing)}}
+        topology.indices, topology.rev_indices = self.indices, self.rev_indices
+        topology.indptr = np.append(self.indptr, np.full(len(missing), self.indptr[-1]))
+        topology.rev_indptr = np.append(self.rev_indptr, np.full(len(missing), self.rev_indptr[-1]))
+        return topology
+
+    def __len__(self):
+        return len(self.services)
+
+    def __contains__(self, service):
+        return service in self.ids
+
+    @property
+    def edge_count(self) -> int:
+        return int(self.indices.shape[0])
+
+    def successors(self, node: int) -> np.ndarray:
+        """Ids of the services ``node`` depends on."""
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+    def predecessors(self, node: int) -> np.ndarray:
+        """Ids of the services that depend on ``node``."""
+        return self.rev_indices[self.rev_indptr[node]:self.rev_indptr[node + 1]]
+
+    def successor_lists(self) -> list:
+        """Adjacency as plain Python lists, for tight pure-Python traversals."""
+        flat = self.indices.tolist()
+        bounds = self.indptr.tolist()
+        return [flat[bounds[i]:bounds[i + 1]] for i in range(len(self.services))]
+
+    def edges(self):
+        """Yield every dependency edge as a (caller, callee) name pair."""
+        bounds = self.indptr.tolist()
+        flat = self.indices.tolist()
+        for node, name in enumerate(self.services):
+            for child in flat[bounds[node]:bounds[node + 1]]:
+                yield name, self.services[child]
+
+    def nbytes(self) -> int:
+        """Memory held by the adjacency arrays."""
+        return sum(a.nbytes for a in (self.indptr, self.indices, self.rev_indptr, self.rev_indices))
+
+
+# ---------------------------------------------------------------------------
+# Helper — parse topology sources
+# ---------------------------------------------------------------------------
+
+def _read_document(path: Path):
+    """Parse a JSON or YAML document."""
+    text = path.read_text(encoding="utf-8")
+    if path.suffix.lower() in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError as e:
+            raise ValueError(f"PyYAML is required to load {path}: {e}")
+        return yaml.safe_load(text)
+    return json.loads(text)
+
+
+def _parse_edge(edge) -> tuple:
+    if isinstance(edge, dict):
+        return str(edge["source"]), str(edge["target"])
+    src, dst = edge
+    return str(src), str(dst)
+
+
+def load_topology_file(path) -> Topology:
+    """Load a topology document with ``services`` and ``edges`` keys."""
+    document = _read_document(Path(path)) or {}
+    edges = [_parse_edge(edge) for edge in document.get("edges", [])]
+    services = [str(name) for name in document.get("services", [])]
+    return Topology.from_edges(edges, services)
+
+
+def load_topology_registry(directory) -> Topology:
+    """Load one ``{"name": ..., "depends_on": [...]}`` document per service file."""
+    services, edges = [], []
+    for path in sorted(Path(directory).iterdir()):
+        if path.suffix.lower() not in _TOPOLOGY_SUFFIXES:
+            continue
+        entry = _read_document(path) or {}
+        name = str(entry.get("name", path.stem))
+        services.append(name)
+        edges.extend((name, str(dep)) for dep in entry.get("depends_on", []))
+    return Topology.from_edges(edges, services)
+
+
+def load_topology(path) -> Topology:
+    """Load a topology from a file or a registry directory."""
+    path = Path(path)
+    if path.is_dir():
+        return load_topology_registry(path)
+    return load_topology_file(path)
+
+
+# ---------------------------------------------------------------------------
+# Hot reload
+# ---------------------------------------------------------------------------
+
+def _source_mtime(path: Path) -> float:
+    """Latest modification time of a topology file or registry directory."""
+    if not path.is_dir():
+        return path.stat().st_mtime
+    mtimes = [path.stat().st_mtime]
+    mtimes.extend(p.stat().st_mtime for p in path.iterdir() if p.suffix.lower() in _TOPOLOGY_SUFFIXES)
+    return max(mtimes)
+
+
+class TopologyLoader:
+    """Loads a topology source and reloads it when the source changes on disk."""
+
+    def __init__(self, path, poll_seconds: float = TOPOLOGY_POLL_SECONDS):
+        self.path = Path(path)
+        self.poll_seconds = poll_seconds
+        self._mtime = None
+        self._last_poll = 0.0
+
+    def load(self) -> Topology:
+        """Load the topology unconditionally and remember the source's mtime."""
+        mtime = _source_mtime(self.path)
+        topology = load_topology(self.path)
+        self._mtime = mtime
+        self._last_poll = time.monotonic()
+        return topology
+
+    def poll(self):
+        """
+        Return a freshly loaded Topology if the source changed since the last
+        load, otherwise None. Checks are throttled to one per ``poll_seconds``.
+        """
+        now = time.monotonic()
+        if now - self._last_poll < self.poll_seconds:
+            return None
+        self._last_poll = now
+        try:
+            if _source_mtime(self.path) == self._mtime:
+                return None
+            return self.load()
+        except Exception:
+            # Keep serving the last good topology (e.g. file caught mid-write)
+            return None
+
+
+def topology_loader(environment: str):
+    """TopologyLoader for an environment's configured source, or None if unset."""
+    if not TOPOLOGY_PATH:
+        return None
+    return TopologyLoader(TOPOLOGY_PATH.replace("{env}", environment))
@@ -0,0 +1,141 @@
+"""
+tree_inference.py
+-----------------
+Pure-NumPy evaluation of the root-cause XGBoost model.
+
+For the tiny batches served per request, XGBoost's per-call overhead dwarfs
+the cost of walking 100 shallow trees. The booster's JSON dump is flattened
+into one set of node arrays shared by every tree (split feature, threshold,
+child pointers, default direction, leaf value). A batch is then evaluated
+by advancing all ``(row, tree)`` cursors one level per step, with leaves
+pointing back to themselves so finished trees simply stay put.
+
+Split semantics follow XGBoost: features and thresholds are compared as
+float32, ``x < threshold`` goes left and missing values take the node's
+default direction.
+"""
+
+import json
+
+import numpy as np
+
+# ---------------------------------------------------------------------------
+# Constants
+# ---------------------------------------------------------------------------
+
+# Objectives whose prediction is sigmoid(margin)
+SUPPORTED_OBJECTIVES = ("binary:logistic",)
+
+
+# ---------------------------------------------------------------------------
+# Helper — booster export
+# ---------------------------------------------------------------------------
+
+def _parse_base_score(value) -> float:
+    """XGBoost 2+ stores base_score as a vector string such as ``'[5E-1]'``."""
+    return float(str(value).strip("[]"))
+
+
+def _tree_depth(left: list, right: list) -> int:
+    depth = 0
+    frontier = [0]
+    while frontier:
+        frontier = [child for node in frontier for child in (left[node], right[node]) if child != -1]
+        depth += bool(frontier)
+    return depth
+
+
+# ---------------------------------------------------------------------------
+# Public backend
+# ---------------------------------------------------------------------------
+
+class CompiledTrees:
+    """Flat node arrays for every tree of a binary:logistic gbtree booster."""
+
+    def __init__(self, trees: list, base_margin: float, num_features: int):
+        """
+        Parameters
+        ----------
+        trees : list of dict
+            Tree entries from the booster's JSON model (``left_children``,
+            ``right_children``, ``split_indices``, ``split_conditions``,
+            ``default_left``).
+        base_margin : float
+            Margin every prediction starts from.
+        num_features : int
+            Width of the feature matrices this model accepts.
+        """
+        feature, threshold, left, right, default_left, leaf_value, roots = [], [], [], [], [], [], []
+        depth = 0
+        for tree in trees:
+            if any(tree.get("split_type", ())):
+                raise ValueError("Categorical splits are not supported by the NumPy backend")
+            offset = len(feature)
+            roots.append(offset)
+            lefts, rights = tree["left_children"], tree["right_children"]
+            depth = max(depth, _tree_depth(lefts, rights))
+            for node, (lo, hi) in enumerate(zip(lefts, rights)):
+                is_leaf = lo == -1
+                feature.append(0 if is_leaf else tree["split_indices"][node])
+                threshold.append(0.0 if is_leaf else tree["split_conditions"][node])
+                left.append(offset + node if is_leaf else offset + lo)
+                right.append(offset + node if is_leaf else offset + hi)
+                default_left.append(bool(tree["default_left"][node]))
+                leaf_value.append(tree["split_conditions"][node] if is_leaf else 0.0)
+
+        self.feature = np.array(feature, dtype=np.intp)
+        self.threshold = np.array(threshold, dtype=np.float32)
+        self.left = np.array(left, dtype=np.intp)
+        self.right = np.array(right, dtype=np.intp)
+        self.default_left = np.array(default_left, dtype=bool)
+        self.leaf_value = np.array(leaf_value, dtype=np.float64)
+        self.roots = np.array(roots, dtype=np.intp)
+        self.depth = depth
+        self.base_margin = base_margin
+        self.num_features = num_features
+
+    @classmethod
+    def from_booster(cls, booster):
+        """Export an ``xgboost.Booster`` (or its JSON dump as bytes/str)."""
+        raw = booster if isinstance(booster, (bytes, str)) else booster.save_raw(raw_format="json")
+        learner = json.loads(raw)["learner"]
+
+        objective = learner["objective"]["name"]
+        if objective not in SUPPORTED_OBJECTIVES:
+            raise ValueError(f"Unsupported objective {objective!r}; expected one of {SUPPORTED_OBJECTIVES}")
+        booster_model = learner["gradient_booster"]
+        if booster_model["name"] != "gbtree":
+            raise ValueError(f"Unsupported booster {booster_model['name']!r}; expected 'gbtree'")
+
+        params = learner["learner_model_param"]
+        base_score = _parse_base_score(params["base_score"])
+        base_margin = float(np.log(base_score / (1.0 - base_score)))
+        return cls(booster_model["model"]["trees"], base_margin, int(params["num_feature"]))
+
+    def __len__(self) -> int:
+        return len(self.roots)
+
+    def predict_margin(self, X) -> np.ndarray:
+        """Raw margin (log-odds) for every row of `X`."""
+        X = np.asarray(X, dtype=np.float32).reshape(-1, self.num_features)
+        rows = np.arange(X.shape[0])[:, None]
+        node = np.broadcast_to(self.roots, (X.shape[0], len(self.roots)))
+        for _ in range(self.depth):
+            value = X[rows, self.feature[node]]
+            go_left = value < self.threshold[node]
+            missing = np.isnan(value)
+            if missing.any():
+                go_left = np.where(missing, self.default_left[node], go_left)
+            node = np.where(go_left, self.left[node], self.right[node])
+        return self.base_margin + self.leaf_value[node].sum(axis=1)
+
+    def predict_proba(self, X) -> np.ndarray:
+        """Positive-class probability for every row of `X`."""
+        return 1.0 / (1.0 + np.exp(-self.predict_margin(X)))
+
+    def nbytes(self) -> int:
+        return sum(
+            array.nbytes
+            for array in (self.feature, self.threshold, self.left, self.right,
+                          self.default_left, self.leaf_value, self.roots)
+        )
@@ -1,9 +1,14 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException
 
 from app.schemas.incident_schema import CustomIncidentRequest
 from app.engines.incident_simulator import generate_telemetry, run_pipeline
-from app.engines.graph_engine import GraphEngine
-from app.engines.ml_engine import rank_services
+from app.engines.environments import (
+    SAMPLE_TELEMETRY_EVENTS,
+    EnvironmentState,
+    environments,
+)
+from app.engines.graph_engine import DEFAULT_ENVIRONMENT, GraphEngine
+from app.engines.ml_engine import rank_services, rank_services_propagation
 
 router = APIRouter()
 
@@ -21,25 +26,28 @@ def apply_rule_boost(service_metrics, base_score):
         boost += 0.15
     return min(base_score + boost, 0.95)
 
-# Global state for dynamic timeline
 from datetime import datetime
 
-SAMPLE_TELEMETRY_EVENTS = [
-    {"timestamp": "2026-02-21T12:03:00", "service": "Payment Gateway", "metric": "latency", "value": 1500, "threshold": 800},
-    {"timestamp": "2026-02-21T12:07:00", "service": "Auth Service", "metric": "retry_rate", "value": 0.4, "threshold": 0.2},
-    {"timestamp": "2026-02-21T12:12:00", "service": "Frontend", "metric": "error_rate", "value": 0.15, "threshold": 0.05},
-    {"timestamp": "2026-02-21T12:25:00", "service": "Database", "metric": "cpu_usage", "value": 0.95, "threshold": 0.8},
-]
 
-_global_events = list(SAMPLE_TELEMETRY_EVENTS)
+def get_environment(
+    x_kairos_environment: str = Header(DEFAULT_ENVIRONMENT, pattern=r"^[A-Za-z0-9_.-]{1,64}$"),
+) -> EnvironmentState:
+    """Select the environment (cluster/tenant) a request operates on."""
+    try:
+        return environments.get(x_kairos_environment)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
 
 
 # ML engine (stateless)
-ml_engine = type("MLEngine", (), {"rank_services": staticmethod(rank_services)})()
+ml_engine = type("MLEngine", (), {
+    "rank_services": staticmethod(rank_services),
+    "rank_services_propagation": staticmethod(rank_services_propagation),
+})()
 
 
 @router.post("/incident/inject")
-def inject_incident(request: CustomIncidentRequest):
+def inject_incident(request: CustomIncidentRequest, env: EnvironmentState = Depends(get_environment)):
     telemetry = generate_telemetry(
         request.service,
         request.error_rate,
@@ -48,18 +56,17 @@ def inject_incident(request: CustomIncidentRequest):
         request.downstream,
     )
 
-    graph_engine = GraphEngine()
+    graph_engine = GraphEngine(env)
     
     # Check for explicit reset flag
     if request.reset_scenario:
-        global _global_events
-        _global_events = []
+        env.events = []
         graph_engine.reset_telemetry()
         # If it's just a reset request, we return after clearing
         if request.error_rate <= 0.05 and request.latency <= 200:
              return {"status": "Timeline and system state reset"}
 
-    result = run_pipeline(telemetry, graph_engine, ml_engine)
+    result = run_pipeline(telemetry, graph_engine, ml_engine, request.ranking_mode)
 
     # 2. Add to dynamic timeline if it's an anomaly
     thresholds = {'error_rate': 0.1, 'latency': 800, 'cpu_usage': 80, 'downstream_failures': 2}
@@ -76,7 +83,7 @@ def inject_incident(request: CustomIncidentRequest):
                 "value": val,
                 "threshold": threshold
             }
-            _global_events.append(event_to_log)
+            env.events.append(event_to_log)
 
     return result
 
@@ -97,67 +104,151 @@ class ServiceFeatures(BaseModel):
 
 class AnalyzeRequest(BaseModel):
     services: Dict[str, ServiceFeatures]
+    # Opt-in feature-pair interactions for the explained hypotheses (budgeted)
+    interactions: bool = False
 
 
-@router.post("/incident/retrain")
+@router.post("/incident/retrain", status_code=202)
 async def retrain_model():
-    from app.engines.ml_model import train_model
+    # Fitting runs in a worker process; the current model keeps serving until
+    # the new version is installed
+    from app.engines.retraining import retrain_manager
     try:
-        train_model(force_retrain=True)
-        return {"status": "Model retrained successfully", "timestamp": datetime.now().isoformat()}
+        job = retrain_manager.submit()
+        return {**job.to_json(), "timestamp": datetime.now().isoformat()}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Retraining failed: {str(e)}")
 
+@router.get("/incident/retrain/{job_id}")
+async def retrain_status(job_id: int):
+    from app.engines.ml_model import model_version
+    from app.engines.retraining import retrain_manager
+    job = retrain_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Retrain job not found")
+    return {**job.to_json(), "serving_version": model_version()}
+
+@router.get("/incident/models")
+async def list_models():
+    from app.engines import ml_model
+    from app.engines.explainability import interaction_budget
+    shadow = ml_model.shadow_model()
+    onnx = ml_model.current_model().onnx
+    return {
+        "serving_version": ml_model.model_version(),
+        "shadow_version": shadow.version if shadow is not None else None,
+        "registry": ml_model.model_registry().describe(ml_model.MODEL_NAME),
+        "shadow": ml_model.shadow_scorer.stats(),
+        "prediction_cache": ml_model.prediction_cache.stats(),
+        "explanation_cache": ml_model.explanation_cache.stats(),
+        "interaction_budget": interaction_budget.stats(),
+        "inference": {
+            "backend": ml_model.INFERENCE_BACKEND,
+            "onnx_parity_error": onnx.parity_error if onnx is not None else None,
+            **ml_model.sharded_scorer.config.to_json(),
+            "small_batch": ml_model.sharded_scorer.small_config.to_json(),
+        },
+    }
+
+def _load_registered(version: int):
+    from app.engines import ml_model
+    try:
+        model, meta = ml_model.load_model(version=version)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if model is None:
+        raise HTTPException(status_code=404, detail=f"Model version {version} not found")
+    return model, meta
+
+@router.post("/incident/models/{version}/shadow")
+async def shadow_model_version(version: int):
+    from app.engines import ml_model
+    from app.engines.model_registry import SHADOW_ALIAS
+    model, meta = _load_registered(version)
+    ml_model.install_shadow(model, meta)
+    ml_model.model_registry().set_alias(ml_model.MODEL_NAME, SHADOW_ALIAS, version)
+    return {"status": f"Shadow scoring model v{version}", "timestamp": datetime.now().isoformat()}
+
+@router.delete("/incident/models/shadow")
+async def stop_shadow_scoring():
+    from app.engines import ml_model
+    from app.engines.model_registry import SHADOW_ALIAS
+    ml_model.install_shadow(None)
+    ml_model.model_registry().set_alias(ml_model.MODEL_NAME, SHADOW_ALIAS, None)
+    return {"status": "Shadow scoring stopped", "timestamp": datetime.now().isoformat()}
+
+@router.post("/incident/models/{version}/promote")
+async def promote_model_version(version: int):
+    from app.engines import ml_model
+    from app.engines.model_registry import PRIMARY_ALIAS, SHADOW_ALIAS
+    model, meta = _load_registered(version)
+    ml_model.install_model(model, meta)
+    registry = ml_model.model_registry()
+    registry.set_alias(ml_model.MODEL_NAME, PRIMARY_ALIAS, version)
+    # A promoted candidate no longer needs shadowing
+    if registry.aliases(ml_model.MODEL_NAME).get(SHADOW_ALIAS) == version:
+        registry.set_alias(ml_model.MODEL_NAME, SHADOW_ALIAS, None)
+        ml_model.install_shadow(None)
+    return {"status": f"Model v{version} promoted to primary", "timestamp": datetime.now().isoformat()}
+
+@router.get("/incident/environments")
+async def list_environments():
+    return environments.stats()
+
 @router.post("/incident/reset")
-async def reset_system():
-    global _global_events
+async def reset_system(env: EnvironmentState = Depends(get_environment)):
     try:
-        _global_events = []
-        ge = GraphEngine()
+        env.events = []
+        ge = GraphEngine(env)
         ge.reset_telemetry()
         return {"status": "System state and timeline reset successfully", "timestamp": datetime.now().isoformat()}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Reset failed: {str(e)}")
 
 @router.post("/incident/analyze")
-async def analyze_incident(request: AnalyzeRequest):
-    import pandas as pd
+async def analyze_incident(request: AnalyzeRequest, env: EnvironmentState = Depends(get_environment)):
     from app.engines.ml_model import train_model
-    from app.engines.explainability import generate_explainability
+    from app.engines.explainability import EXPLAINED_HYPOTHESES, generate_explanations
 
     try:
         model = train_model()
         
         # 1. Update GraphEngine with current request metrics for context-aware ranking
-        graph_engine = GraphEngine()
-        for service_name, features in request.services.items():
-            # Sync graph engine with request telemetry before impact calculation
-            graph_engine.attach_telemetry({
+        graph_engine = GraphEngine(env)
+        # Publish all request telemetry as one version and read impact back from
+        # that same snapshot, so concurrent requests cannot interleave
+        snapshot = graph_engine.attach_telemetry_batch([
+            {
                 "service": service_name,
                 "error_rate": features.error_rate,
                 "latency": features.latency,
                 "cpu": features.cpu_usage,
                 "downstream_failures": features.downstream_failures
-            })
-            
-        impact_scores = graph_engine.calculate_impact()
+            }
+            for service_name, features in request.services.items()
+        ])
+        impact_scores = graph_engine.calculate_impact(snapshot)
 
         # 2. Rank services to find the top suspect
-        predictions = []
-        from app.engines.ml_model import predict_service_probability
-        
+        from app.engines.ml_model import predict_service_probabilities
+
+        feature_dicts = []
         for service_name, features in request.services.items():
             fd = features.dict()
             fd["impact_score"] = impact_scores.get(service_name, 0)
-            
-            # Use unified prediction function for capping and normalization
-            base_prob = predict_service_probability(fd)
+            feature_dicts.append(fd)
+
+        # Score every service in one model call (capping and normalization included)
+        base_probs = predict_service_probabilities(feature_dicts, services=list(request.services))
+
+        predictions = []
+        for service_name, fd, base_prob in zip(request.services, feature_dicts, base_probs.tolist()):
             # 🚀 Apply "Hackathon-Ready" Heuristic Boost
             boosted_prob = apply_rule_boost(fd, base_prob)
-            
+
             predictions.append({
-                "service": service_name, 
-                "prob": boosted_prob, 
+                "service": service_name,
+                "prob": boosted_prob,
                 "features": fd
             })
 
@@ -169,20 +260,30 @@ async def analyze_incident(request: AnalyzeRequest):
                 p["confidence"] = int(p["prob"] * 100)
 
         predictions.sort(key=lambda x: x["prob"], reverse=True)
-        top = predictions[0]
 
-        # 3. Generate SHAP-based explainability for the top suspect
+        # 3. Generate SHAP-based explainability for the top-k suspects in one batch
         # Use our normalized relative confidence for the explanation section
-        explain_result = generate_explainability(top["service"], top["features"], confidence=top["confidence"])
+        explained = predictions[:max(EXPLAINED_HYPOTHESES, 1)]
+        explanations = generate_explanations(
+            [p["service"] for p in explained],
+            [p["features"] for p in explained],
+            confidences=[p["confidence"] for p in explained],
+            interactions=request.interactions,
+        )
 
         # 4. Build final response - Show all ranked services with their relative confidence
         ai_hypotheses = []
-        for p in predictions:
-            ai_hypotheses.append({"service": p["service"], "confidence": p["confidence"]})
+        for i, p in enumerate(predictions):
+            hypothesis = {"service": p["service"], "confidence": p["confidence"]}
+            if i < len(explanations):
+                hypothesis["feature_importance"] = explanations[i]["feature_importance"]
+                if request.interactions:
+                    hypothesis["interactions"] = explanations[i]["interactions"]
+            ai_hypotheses.append(hypothesis)
         
         return {
             "ai_hypotheses": ai_hypotheses,
-            "root_cause_analysis": explain_result
+            "root_cause_analysis": explanations[0]
         }
         
     except Exception as e:
@@ -192,29 +293,28 @@ async def analyze_incident(request: AnalyzeRequest):
 
 
 @router.get("/incident/timeline")
-async def get_incident_timeline():
+async def get_incident_timeline(env: EnvironmentState = Depends(get_environment)):
     try:
         from app.engines.timeline_engine import generate_timeline
     except ImportError as e:
         raise HTTPException(501, f"Timeline engine unavailable: {e}")
     try:
         # Use dynamic events if available, otherwise fallback to sample for initial state
-        events = _global_events if _global_events else SAMPLE_TELEMETRY_EVENTS
+        events = env.events if env.events else SAMPLE_TELEMETRY_EVENTS
         timeline = generate_timeline(events)
         return {"timeline": timeline}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Timeline generation failed: {str(e)}")
 
 @router.get("/incident/logs/{service_id}")
-async def get_service_logs(service_id: str):
-    from app.engines.graph_engine import _global_telemetry
+async def get_service_logs(service_id: str, env: EnvironmentState = Depends(get_environment)):
     import random
     from datetime import datetime, timedelta
 
-    if service_id not in _global_telemetry:
+    if service_id not in env.telemetry:
         raise HTTPException(status_code=404, detail="Service not found")
     
-    metrics = _global_telemetry[service_id]
+    metrics = env.telemetry[service_id]
     error_rate = metrics.get("error_rate", 0)
     latency = metrics.get("latency", 0)
     
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic import BaseModel
 
 
@@ -8,3 +10,5 @@ class CustomIncidentRequest(BaseModel):
     cpu: float
     downstream: int
     reset_scenario: bool = False
+    # "impact" sorts by impact score; "propagation" runs personalized PageRank
+    ranking_mode: Literal["impact", "propagation"] = "impact"
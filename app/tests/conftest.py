@@ -0,0 +1,24 @@
+"""
+Shared test configuration.
+
+Models trained by the tests go to a throwaway registry, never to the
+repository's own models/ directory.
+"""
+
+import os
+import shutil
+import tempfile
+
+_model_dir = None
+
+
+def pytest_configure(config):
+    # Must be set before app.engines.ml_model is imported, which reads it once
+    global _model_dir
+    _model_dir = tempfile.mkdtemp(prefix="kairos-models-")
+    os.environ["KAIROS_MODEL_DIR"] = _model_dir
+
+
+def pytest_unconfigure(config):
+    if _model_dir is not None:
+        shutil.rmtree(_model_dir, ignore_errors=True)
@@ -0,0 +1,159 @@
+"""
+Explainability Tests
+
+Checks the SHAP explanations attached to root-cause hypotheses.
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from app.engines import explainability, ml_model
+from app.engines.explainability import generate_explainability, generate_explanations
+
+SUSPECT = {"error_rate": 0.7, "latency": 1400, "cpu_usage": 75, "downstream_failures": 2, "impact_score": 0.3}
+
+
+@pytest.fixture
+def serving(tmp_path_factory, monkeypatch):
+    from app.engines.explanation_cache import ExplanationCache
+
+    model, meta = ml_model.retrain_and_save(tmp_path_factory.mktemp("models"))
+    monkeypatch.setattr(ml_model, "_serving", None)
+    # Disabled, so every call exercises the explanation backends
+    monkeypatch.setattr(explainability, "explanation_cache", ExplanationCache(max_entries=0))
+    monkeypatch.setattr(ml_model, "explanation_cache", explainability.explanation_cache)
+    return ml_model.install_model(model, meta)
+
+
+def test_explanation_shape(serving):
+    result = generate_explainability("Payment Gateway", SUSPECT, confidence=87)
+    assert result["top_suspect"] == "Payment Gateway"
+    assert result["confidence"] == 87
+    assert len(result["feature_importance"]) == len(ml_model.FEATURE_COLUMNS)
+    assert sum(item["impact_percent"] for item in result["feature_importance"]) == pytest.approx(100, abs=0.5)
+    assert result["feature_importance"][0]["direction"] == "positive"
+
+
+def test_explainer_is_built_once_per_model(serving, monkeypatch):
+    import shap
+    from concurrent.futures import ThreadPoolExecutor
+
+    built = []
+    tree_explainer = shap.TreeExplainer
+    monkeypatch.setattr(shap, "TreeExplainer", lambda model: built.append(model) or tree_explainer(model))
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda _: generate_explainability("api", SUSPECT), range(8)))
+    assert len(built) == 1
+    assert all(result == results[0] for result in results)
+
+    # A retrain installs a new model, which gets its own explainer
+    replacement = ml_model.install_model(serving.model, serving.meta)
+    generate_explainability("api", SUSPECT)
+    assert len(built) == 2 and replacement.explainer is not serving.explainer
+    assert np.allclose(replacement.explainer.expected_value, serving.explainer.expected_value)
+
+
+def test_batched_explanations_match_single_ones(serving, monkeypatch):
+    batch = [SUSPECT, {"error_rate": 0.01, "latency": 90}, {"cpu_usage": 99, "downstream_failures": 5}]
+    names = ["api", "db", "cache"]
+
+    calls = []
+    shap_values = serving.explainer.shap_values
+    monkeypatch.setattr(serving.explainer, "shap_values", lambda X: calls.append(len(X)) or shap_values(X))
+    results = generate_explanations(names, batch)
+    assert calls == [3]
+
+    for name, features, result in zip(names, batch, results):
+        single = generate_explainability(name, features)
+        assert result["top_suspect"] == name and result["summary"] == single["summary"]
+        assert result["confidence"] == single["confidence"]
+        assert [item["shap_value"] for item in result["feature_importance"]] == pytest.approx(
+            [item["shap_value"] for item in single["feature_importance"]], abs=1e-6)
+    assert generate_explanations([], []) == []
+
+
+def test_xgboost_backend_matches_shap(serving, monkeypatch):
+    import subprocess
+    import sys
+
+    rng = np.random.default_rng(5)
+    X = rng.uniform(ml_model.FEATURE_LOWER, ml_model.FEATURE_UPPER, size=(200, len(ml_model.FEATURE_COLUMNS)))
+    expected = explainability.shap_rows(serving, X)
+    monkeypatch.setattr(explainability, "EXPLANATION_BACKEND", "xgboost")
+    assert np.allclose(explainability.shap_rows(serving, X), expected, atol=1e-5)
+
+    batch = [SUSPECT, {"latency": 4000, "downstream_failures": 4}]
+    native = generate_explanations(["api", "db"], batch, confidences=[60, 30])
+    monkeypatch.setattr(explainability, "EXPLANATION_BACKEND", "shap")
+    assert [r["summary"] for r in native] == [r["summary"] for r in generate_explanations(["api", "db"], batch)]
+
+    # Serving explanations with the native backend never loads shap
+    code = (
+        "import sys; from app.engines import explainability, ml_model; "
+        "explainability.EXPLANATION_BACKEND = 'xgboost'; "
+        "explainability.generate_explainability('api', {'latency': 3000}); "
+        "sys.exit('shap' in sys.modules)"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=Path(__file__).resolve().parents[2])
+
+
+def test_explanation_cache_serves_repeats_until_retrain(serving, monkeypatch):
+    from app.engines.explanation_cache import ExplanationCache
+
+    cache = ExplanationCache(max_entries=2)
+    monkeypatch.setattr(explainability, "explanation_cache", cache)
+    monkeypatch.setattr(ml_model, "explanation_cache", cache)
+    computed = []
+    rows = explainability.shap_rows
+    monkeypatch.setattr(explainability, "shap_rows", lambda s, X: computed.append(len(X)) or rows(s, X))
+
+    first = generate_explanations(["api", "db"], [SUSPECT, {"latency": 90}], confidences=[70, 20])
+    again = generate_explanations(["api", "db"], [SUSPECT, {"latency": 90.0001}], confidences=[70, 20])
+    assert again[0] is first[0] and again[1] is first[1]
+    # A different confidence or service only recomputes that row
+    mixed = generate_explanations(["api", "web"], [SUSPECT, {"latency": 90}], confidences=[65, 20])
+    assert mixed[0]["confidence"] == 65 and mixed[1]["top_suspect"] == "web"
+    assert computed == [2, 2]
+    assert cache.stats()["hits"] == 2 and cache.stats()["evictions"] == 2
+
+    ml_model.install_model(serving.model, serving.meta)
+    assert cache.stats()["entries"] == 0
+    generate_explanations(["api"], [SUSPECT], confidences=[65])
+    assert computed == [2, 2, 1]
+
+    # Same quantization bucket, opposite sides of the 400 ms latency threshold
+    below = generate_explainability("api", {**SUSPECT, "latency": 399.9}, confidence=65)
+    above = generate_explainability("api", {**SUSPECT, "latency": 400.1}, confidence=65)
+    direction = {item["feature"]: item["direction"] for item in above["feature_importance"]}
+    assert below is not above and direction["Latency"] == "positive"
+
+
+def test_interactions_are_opt_in_and_budgeted(serving, monkeypatch):
+    assert "interactions" not in generate_explainability("api", SUSPECT)
+
+    budget = explainability.InteractionBudget(seconds=10.0, max_rows=2)
+    monkeypatch.setattr(explainability, "interaction_budget", budget)
+    result = generate_explainability("api", SUSPECT, interactions=True)
+    assert result["interaction_mode"] == "pairs"
+    assert len(result["interactions"]) == explainability.INTERACTION_TOP_PAIRS
+    values = [abs(pair["interaction_value"]) for pair in result["interactions"]]
+    assert values == sorted(values, reverse=True)
+
+    X = ml_model.feature_matrix([SUSPECT]).copy()
+    expected = explainability.interaction_rows(serving, X)
+    monkeypatch.setattr(explainability, "EXPLANATION_BACKEND", "xgboost")
+    assert np.allclose(explainability.interaction_rows(serving, X), expected, atol=1e-5)
+
+    # Too many rows, or a predicted cost over the time budget, falls back to main effects
+    over = generate_explanations(["a", "b", "c"], [SUSPECT] * 3, interactions=True)
+    assert all(r["interaction_mode"] == "main_effects" and r["interactions"] is None for r in over)
+    budget.record(serving.generation, 1, 60.0)
+    assert generate_explainability("api", SUSPECT, interactions=True)["interactions"] is None
+    assert budget.stats()["fallbacks"] == 2
+
+    # The estimate starts over for a newly installed model
+    ml_model.install_model(serving.model, serving.meta)
+    assert generate_explainability("api", SUSPECT, interactions=True)["interaction_mode"] == "pairs"
@@ -0,0 +1,502 @@
+"""
+Graph Engine Tests
+
+Checks that the long-lived service graph keeps impact scores consistent with a
+full rebuild while only recomputing what changed.
+"""
+
+from app.engines.graph_engine import (
+    ServiceGraphModel,
+    build_graph_with_override,
+    _default_telemetry,
+)
+
+
+def _reference_graph(telemetry):
+    """Impact and centrality recomputed from scratch with networkx."""
+    import networkx as nx
+    from app.engines.graph_engine import DEPENDENCY_EDGES
+
+    graph = nx.DiGraph(DEPENDENCY_EDGES)
+    graph.add_nodes_from(telemetry)
+    centrality = nx.betweenness_centrality(graph)
+    return {
+        node: {
+            "impact_score": min(1.0, telemetry.get(node, {}).get("error_rate", 0)
+                                * (1 + len(nx.descendants(graph, node))) / len(graph)),
+            "centrality": centrality[node],
+        }
+        for node in graph
+    }
+
+
+def test_incremental_update_matches_full_rebuild():
+    import pytest
+
+    telemetry = _default_telemetry()
+    model = ServiceGraphModel(telemetry=telemetry)
+    model.impact_scores()
+
+    spike = {"error_rate": 0.6, "latency": 1800, "cpu_usage": 90, "downstream_failures": 3}
+    model.update_telemetry("payment-service", spike)
+    telemetry = {**_default_telemetry(), "payment-service": spike}
+
+    expected = _reference_graph(telemetry)
+    assert model.impact_scores() == pytest.approx({n: v["impact_score"] for n, v in expected.items()})
+
+
+def test_override_graph_reuses_the_topology_indexes(monkeypatch):
+    import pytest
+    from app.engines import centrality
+    from app.engines.reachability import ReachabilityIndex
+
+    def fail(*args, **kwargs):
+        raise AssertionError("topology indexes rebuilt for a telemetry override")
+
+    monkeypatch.setattr(centrality, "_brandes", fail)
+    monkeypatch.setattr(ReachabilityIndex, "from_topology", fail)
+    override = {"database": {"error_rate": 0.7}, "ledger": {"error_rate": 0.2}}
+    graph = build_graph_with_override(override)
+    monkeypatch.undo()
+
+    telemetry = _default_telemetry()
+    telemetry["database"].update(override["database"])
+    telemetry["ledger"] = override["ledger"]
+    expected = _reference_graph(telemetry)
+    assert set(graph) == set(expected)
+    for node, data in graph.nodes(data=True):
+        assert data["impact_score"] == pytest.approx(expected[node]["impact_score"])
+        assert data["centrality"] == pytest.approx(expected[node]["centrality"])
+
+
+def test_publish_copies_on_write():
+    model = ServiceGraphModel(telemetry=_default_telemetry())
+    before = model.snapshot()
+    database = before.topology.ids["database"]
+
+    after = model.publish({"database": {"error_rate": 0.5}, "frontend": _default_telemetry()["frontend"]})
+    assert after.version > before.version
+    # The database and its caller, whose downstream failure propagation moved
+    payment = before.topology.ids["payment-service"]
+    assert after.node_versions.tolist().count(after.version) == 2
+    assert after.node_versions[database] == after.node_versions[payment] == after.version
+    assert before.impact_engine.metrics[database, 0] == 0.01
+    assert after.impact_engine.metrics[database, 0] == 0.5
+    assert not after.impact_engine.impact.flags.writeable
+
+
+def test_concurrent_writers_never_expose_torn_snapshots():
+    import threading
+    import numpy as np
+    from app.engines.impact_engine import impact_scores
+
+    model = ServiceGraphModel(telemetry=_default_telemetry())
+    services = model.topology.services
+    errors = []
+
+    def writer(seed):
+        rng = np.random.default_rng(seed)
+        for _ in range(200):
+            rate = float(rng.uniform())
+            model.publish({service: {"error_rate": rate} for service in services})
+
+    def reader():
+        for _ in range(400):
+            snapshot = model.snapshot()
+            engine = snapshot.impact_engine
+            if len(set(engine.error_rate.tolist())) != 1:
+                errors.append("mixed batch")
+            expected = impact_scores(engine.error_rate, engine.blast_radius, len(snapshot.topology))
+            if not np.array_equal(engine.impact, expected):
+                errors.append("stale impact")
+
+    threads = [threading.Thread(target=writer, args=(seed,)) for seed in range(3)]
+    threads += [threading.Thread(target=reader) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    # The raw telemetry dict is written in publish order, so it ends on the last snapshot
+    final = model.snapshot().impact_engine.error_rate.tolist()
+    assert [model.telemetry[service]["error_rate"] for service in services] == final
+
+
+def test_new_service_triggers_topology_rebuild():
+    model = ServiceGraphModel(telemetry=_default_telemetry())
+    model.update_telemetry("cache", {"error_rate": 0.2})
+
+    scores = model.impact_scores()
+    snapshot = model.snapshot()
+    assert "cache" in scores
+    assert snapshot.blast_radius[model.topology.ids["cache"]] == 0
+    assert snapshot.blast_radius[model.topology.ids["frontend"]] == 3
+
+
+def test_new_services_extend_indexes_without_recomputing(monkeypatch):
+    import random
+    import networkx as nx
+    import pytest
+    from app.engines import centrality
+    from app.engines.reachability import ReachabilityIndex
+    from app.engines.topology import Topology
+
+    edges = [(f"s{i}", f"s{j}") for i in range(30) for j in (i + 1, i * 2 + 3) if j < 30] + [("s29", "s5")]
+    model = ServiceGraphModel(topology=Topology.from_edges(edges), telemetry={})
+    model.snapshot()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("full recomputation on the request path")
+
+    monkeypatch.setattr(centrality, "_brandes", fail)
+    monkeypatch.setattr(ReachabilityIndex, "from_topology", fail)
+    snapshot = model.publish({"new-a": {"error_rate": 0.4}, "new-b": {"error_rate": 0.1}})
+    monkeypatch.undo()
+
+    graph = nx.DiGraph(edges)
+    graph.add_nodes_from(["new-a", "new-b"])
+    expected = nx.betweenness_centrality(graph)
+    services = snapshot.services
+    assert snapshot.centrality == pytest.approx([expected[service] for service in services])
+    rebuilt = ReachabilityIndex.from_topology(Topology.from_edges(edges, services))
+    assert snapshot.reachability.blast_radii() == rebuilt.blast_radii()
+    assert all(
+        sorted(snapshot.descendants(service)) == sorted(nx.descendants(graph, service)) for service in services
+    )
+    assert snapshot.impact_scores() == pytest.approx(
+        ServiceGraphModel(topology=snapshot.topology, telemetry=dict(model.telemetry)).impact_scores()
+    )
+
+    # Sampled mode: the pivots came from the original nodes, so repeated
+    # extensions only move the 1/((n-1)(n-2)) term and never compound
+    topology = Topology.from_edges(edges)
+    cache = centrality.CentralityCache(exact_max_nodes=10, pivots=8)
+    cache.get(topology)
+    grown = topology
+    for batch in (["x0", "x1"], ["x2", "x3", "x4"]):
+        previous, grown = grown, grown.with_services(batch)
+        scores = cache.extend(previous, grown)
+    pivots = random.Random(centrality.APPROX_BETWEENNESS_SEED).sample(range(30), 8)
+    raw = [0.0] * 30
+    for source in pivots:
+        for target in nx.descendants(graph, topology.services[source]):
+            counts = {}
+            all_paths = list(nx.all_shortest_paths(graph, topology.services[source], target))
+            for path in all_paths:
+                for node in path[1:-1]:
+                    counts[node] = counts.get(node, 0) + 1
+            for node, count in counts.items():
+                raw[topology.ids[node]] += count / len(all_paths)
+    scale = (30 / 8) / (34 * 33)
+    assert scores == pytest.approx([value * scale for value in raw] + [0.0] * 5)
+
+
+def test_reachability_index_matches_networkx_on_cyclic_graph():
+    import random
+    import networkx as nx
+    from app.engines.reachability import ReachabilityIndex
+
+    rng = random.Random(7)
+    graph = nx.gnp_random_graph(60, 0.04, seed=7, directed=True)
+    graph.add_edges_from([(5, 5), (10, 11), (11, 10)])
+    index, nodes = ReachabilityIndex.from_graph(graph)
+
+    for node_id, node in enumerate(nodes):
+        expected = nx.descendants(graph, node)
+        assert index.blast_radius(node_id) == len(expected)
+        assert {nodes[i] for i in index.descendants(node_id)} == expected
+    for _ in range(200):
+        u, v = rng.randrange(60), rng.randrange(60)
+        expected = graph.has_edge(u, v) or (u != v and nx.has_path(graph, u, v)) or (
+            u == v and any(nx.has_path(graph, s, u) for s in graph.successors(u))
+        )
+        assert index.reaches(nodes.index(u), nodes.index(v)) == expected
+
+
+def _random_topology(node_count, p, seed):
+    import networkx as nx
+    from app.engines.topology import Topology
+
+    graph = nx.gnp_random_graph(node_count, p, seed=seed, directed=True)
+    return graph, Topology.from_edges(graph.edges(), services=list(graph.nodes()))
+
+
+def test_centrality_is_cached_per_topology_version():
+    model = ServiceGraphModel(telemetry=_default_telemetry())
+    cached = model.snapshot().centrality
+    version = model.topology_version
+
+    snapshot = model.update_telemetry("database", {"error_rate": 0.9})
+    assert snapshot.topology_version == version
+    assert snapshot.centrality is cached
+
+    snapshot = model.update_telemetry("cache", {"error_rate": 0.1})
+    assert snapshot.topology_version != version
+    assert snapshot.centrality is not cached
+
+
+def test_exact_betweenness_matches_networkx():
+    import networkx as nx
+    from app.engines.centrality import betweenness_centrality
+
+    graph, topology = _random_topology(80, 0.05, seed=11)
+    expected = nx.betweenness_centrality(graph)
+    scores = betweenness_centrality(topology)
+    for node, score in expected.items():
+        assert abs(scores[topology.ids[node]] - score) < 1e-9
+
+
+def test_approximate_betweenness_is_reproducible():
+    from app.engines.centrality import betweenness_centrality
+
+    _, topology = _random_topology(300, 0.02, seed=3)
+    exact = betweenness_centrality(topology)
+    first = betweenness_centrality(topology, exact_max_nodes=100, pivots=50)
+    second = betweenness_centrality(topology, exact_max_nodes=100, pivots=50)
+    assert first == second
+    assert first != exact
+
+
+def test_topology_compiles_to_csr():
+    from app.engines.topology import Topology
+
+    topology = Topology.from_edges([("a", "b"), ("a", "c"), ("b", "c"), ("a", "b")])
+    assert topology.services == ["a", "b", "c"]
+    assert topology.indptr.tolist() == [0, 2, 3, 3]
+    assert topology.indices.tolist() == [1, 2, 2]
+    assert topology.predecessors(topology.ids["c"]).tolist() == [0, 1]
+
+
+def test_topology_loader_reads_file_and_registry(tmp_path):
+    import json
+    from app.engines.topology import TopologyLoader, load_topology
+
+    path = tmp_path / "topology.json"
+    path.write_text(json.dumps({
+        "services": ["edge"],
+        "edges": [["frontend", "auth-service"], {"source": "auth-service", "target": "database"}],
+    }))
+    loader = TopologyLoader(path, poll_seconds=0)
+    topology = loader.load()
+    assert topology.services == ["edge", "frontend", "auth-service", "database"]
+    assert loader.poll() is None
+
+    path.write_text(json.dumps({"edges": [["frontend", "database"]]}))
+    import os
+    os.utime(path, (1, 1))
+    reloaded = loader.poll()
+    assert list(reloaded.edges()) == [("frontend", "database")]
+
+    registry = tmp_path / "registry"
+    registry.mkdir()
+    (registry / "frontend.json").write_text(json.dumps({"name": "frontend", "depends_on": ["db"]}))
+    (registry / "db.json").write_text(json.dumps({"name": "db"}))
+    assert sorted(load_topology(registry).edges()) == [("frontend", "db")]
+
+
+def test_model_hot_reloads_topology(tmp_path):
+    import json
+    import os
+    from app.engines.topology import TopologyLoader
+
+    path = tmp_path / "topology.json"
+    path.write_text(json.dumps({"edges": [["a", "b"]]}))
+    model = ServiceGraphModel(telemetry={"a": {"error_rate": 0.5}}, loader=TopologyLoader(path, poll_seconds=0))
+    assert model.descendants("a") == ["b"]
+
+    path.write_text(json.dumps({"edges": [["a", "b"], ["b", "c"]]}))
+    os.utime(path, (1, 1))
+    model.reload_topology()
+    assert sorted(model.descendants("a")) == ["b", "c"]
+    assert model.impact_scores()["a"] == 0.5
+
+
+def test_impact_engine_vectorized_kernels():
+    import numpy as np
+    from app.engines.impact_engine import ImpactEngine
+    from app.engines.reachability import ReachabilityIndex
+
+    graph, topology = _random_topology(500, 0.01, seed=5)
+    rng = np.random.default_rng(5)
+    telemetry = {node: {"error_rate": float(rng.uniform())} for node in graph.nodes()}
+    blast = ReachabilityIndex.from_topology(topology).blast_radii()
+    engine = ImpactEngine(topology, blast, telemetry)
+
+    node_count = len(topology)
+    for node, metrics in telemetry.items():
+        i = topology.ids[node]
+        expected = min(1.0, metrics["error_rate"] * (1 + blast[i]) / node_count)
+        assert abs(engine.impact[i] - expected) < 1e-12
+        downstream = sum(telemetry[child]["error_rate"] for child in graph.successors(node))
+        assert abs(engine.downstream_failure_propagation()[i] - downstream) < 1e-9
+    assert np.allclose(engine.blast_weighted_error(), engine.error_rate * np.asarray(blast))
+
+
+def test_versioned_delta_serialization():
+    model = ServiceGraphModel(telemetry=_default_telemetry())
+    full = model.to_json()
+    version, etag = full["version"], model.etag
+    assert len(full["nodes"]) == 4 and len(full["edges"]) == 3
+
+    # Re-sending identical telemetry is not a change
+    model.update_telemetry("database", _default_telemetry()["database"])
+    assert model.etag == etag
+
+    model.update_telemetry("database", {"error_rate": 0.4})
+    assert model.etag != etag
+    delta = model.to_json(since=version)
+    assert delta["full"] is False and delta["edges"] == []
+    # The caller is included because its downstream failure propagation changed
+    assert [node["id"] for node in delta["nodes"]] == ["payment-service", "database"]
+    assert delta["nodes"][0]["downstream_failure_propagation"] == 0.4
+    assert delta["nodes"][1]["blast_weighted_error"] == 0.0
+    assert model.to_json(since=model.version)["nodes"] == []
+
+    model.update_telemetry("cache", {"error_rate": 0.1})
+    assert model.to_json(since=version)["full"] is True
+
+
+def test_neighborhood_query_and_pagination():
+    from app.engines.graph_query import query_graph
+    from app.engines.topology import Topology
+
+    topology = Topology.from_edges([("a", "b"), ("b", "c"), ("c", "d"), ("x", "b")])
+    telemetry = {name: {"error_rate": 0.1 * (i + 1)} for i, name in enumerate(topology.services)}
+    model = ServiceGraphModel(topology=topology, telemetry=telemetry).snapshot()
+
+    def ids(result):
+        return [node["id"] for node in result["nodes"]]
+
+    assert ids(query_graph(model, "b", hops=1)) == ["a", "b", "c", "x"]
+    assert ids(query_graph(model, "b", hops=2, direction="downstream")) == ["b", "c", "d"]
+    assert ids(query_graph(model, "c", hops=5, direction="upstream")) == ["a", "b", "c", "x"]
+
+    result = query_graph(model, "b", hops=1, direction="downstream")
+    assert result["edges"] == [{"source": "b", "target": "c"}]
+
+    first = query_graph(model, limit=3)
+    assert ids(first) == ["a", "b", "c"] and first["next_cursor"] == 2
+    rest = query_graph(model, limit=3, cursor=first["next_cursor"])
+    assert ids(rest) == ["d", "x"] and rest["next_cursor"] is None
+    assert len(first["edges"]) + len(rest["edges"]) == topology.edge_count
+
+    impacts = model.impact_scores()
+    assert all(impacts[n] >= 0.05 for n in ids(query_graph(model, min_impact=0.05)))
+
+
+def test_filtered_and_delta_views_have_their_own_etags():
+    from app.engines.graph_query import query_graph
+
+    model = ServiceGraphModel(telemetry=_default_telemetry())
+    snapshot = model.snapshot()
+    assert snapshot.etag_for(since=None, service=None) == snapshot.etag
+    tags = {
+        snapshot.etag_for(since=snapshot.version),
+        snapshot.etag_for(service="database", hops=1, direction="both"),
+        snapshot.etag_for(service="database", hops=2, direction="both"),
+        snapshot.etag_for(min_impact=0.1),
+        snapshot.etag,
+    }
+    assert len(tags) == 5 and snapshot.etag_for(min_impact=0.1) == snapshot.etag_for(min_impact=0.1)
+
+    version = snapshot.version
+    model.update_telemetry("database", {"error_rate": 0.4})
+    delta = query_graph(model.snapshot(), min_impact=0.0, since=version)
+    assert delta["full"] is False and [n["id"] for n in delta["nodes"]] == ["payment-service", "database"]
+    # A new service changes the topology, so the delta must replace the caller's state
+    model.update_telemetry("cache", {"error_rate": 0.1})
+    replaced = query_graph(model.snapshot(), min_impact=0.0, since=version)
+    assert replaced["full"] is True and len(replaced["nodes"]) == 5 and replaced["edges"]
+
+
+def test_environments_are_isolated_and_lru_evicted():
+    from app.engines.environments import EnvironmentRegistry
+    from app.engines.graph_engine import GraphEngine
+
+    registry = EnvironmentRegistry(max_environments=3)
+    GraphEngine(registry.get("us-east")).attach_telemetry({"service": "database", "error_rate": 0.9})
+    assert registry.get("us-east").telemetry["database"]["error_rate"] == 0.9
+    assert registry.get("eu-west").telemetry["database"]["error_rate"] == 0.01
+
+    registry.get("us-east")
+    registry.get("staging")
+    assert "eu-west" not in registry
+    assert "us-east" in registry and "default" in registry
+    assert registry.evictions == 1
+
+    tiny = EnvironmentRegistry(max_bytes=1)
+    tiny.get("a")
+    tiny.get("b")
+    assert "a" not in tiny and "b" in tiny and "default" in tiny
+
+
+def test_environment_size_is_measured_on_publish_not_per_request(monkeypatch):
+    from app.engines.environments import EnvironmentRegistry, EnvironmentState
+    from app.engines.graph_engine import GraphEngine
+
+    registry = EnvironmentRegistry()
+    state = registry.get("us-east")
+    before = state.nbytes
+
+    measured = []
+    measure = EnvironmentState.measure
+    monkeypatch.setattr(EnvironmentState, "measure", lambda self: measured.append(self.name) or measure(self))
+    for _ in range(5):
+        registry.get("us-east")
+    assert measured == []
+
+    GraphEngine(state).attach_telemetry_batch(
+        [{"service": f"svc-{i}", "error_rate": 0.1} for i in range(50)]
+    )
+    assert measured and state.nbytes > before
+
+
+def test_building_an_environment_does_not_block_the_others(monkeypatch):
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from app.engines import environments
+    from app.engines.environments import EnvironmentRegistry, EnvironmentState
+
+    registry = EnvironmentRegistry()
+    registry.get("us-east")
+    release, built = threading.Event(), []
+
+    class SlowState(EnvironmentState):
+        def __init__(self, name):
+            built.append(name)
+            release.wait(5)
+            super().__init__(name)
+
+    monkeypatch.setattr(environments, "EnvironmentState", SlowState)
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        slow = [pool.submit(registry.get, "big-cluster") for _ in range(2)]
+        # Known environments are served while the new one is still building
+        assert registry.get().name == "default" and registry.get("us-east").name == "us-east"
+        assert not any(future.done() for future in slow)
+        release.set()
+        states = [future.result(timeout=5) for future in slow]
+    assert built == ["big-cluster"] and states[0] is states[1]
+    assert registry.get("big-cluster") is states[0]
+
+
+def test_unknown_environment_topology_is_a_lookup_error(tmp_path, monkeypatch):
+    import json
+    import pytest
+    from fastapi import HTTPException
+    from app.engines import topology
+    from app.engines.environments import EnvironmentRegistry
+    from app.routes import incident
+
+    (tmp_path / "prod.json").write_text(json.dumps({"edges": [["web", "db"]]}))
+    monkeypatch.setattr(topology, "TOPOLOGY_PATH", str(tmp_path / "{env}.json"))
+    registry = EnvironmentRegistry(default_state=incident.environments.get())
+
+    assert "web" in registry.get("prod").graph_model.topology
+    with pytest.raises(KeyError):
+        registry.get("typo")
+    assert "typo" not in registry
+
+    monkeypatch.setattr(incident, "environments", registry)
+    with pytest.raises(HTTPException) as error:
+        incident.get_environment("typo")
+    assert error.value.status_code == 404
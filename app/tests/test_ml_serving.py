@@ -0,0 +1,307 @@
+"""
+ML Serving Tests
+
+Checks how the root-cause classifier is persisted, loaded and served.
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+from app.engines import ml_model
+
+
+@pytest.fixture(scope="module")
+def model_dir(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("models")
+    ml_model.retrain_and_save(directory)
+    return directory
+
+
+def test_persisted_model_round_trips(model_dir):
+    model, meta = ml_model.load_model(model_dir)
+    assert meta["version"] == 1
+    assert meta["feature_schema_hash"] == ml_model.FEATURE_SCHEMA_HASH
+
+    X, _ = ml_model._synthetic_training_data(n_samples=50, seed=1)
+    fresh = ml_model.fit_model()
+    assert np.allclose(model.predict_proba(X), fresh.predict_proba(X))
+
+
+def test_registry_versions_aliases_and_schema_check(tmp_path):
+    from app.engines.model_registry import PRIMARY_ALIAS, SHADOW_ALIAS
+
+    assert ml_model.load_model(tmp_path) == (None, None)
+    ml_model.retrain_and_save(tmp_path, fmt="json")
+    _, meta = ml_model.retrain_and_save(tmp_path, promote=False)
+    assert meta["version"] == 2
+
+    registry = ml_model.model_registry(tmp_path)
+    assert registry.versions(ml_model.MODEL_NAME) == [1, 2]
+    assert registry.aliases(ml_model.MODEL_NAME) == {PRIMARY_ALIAS: 1, SHADOW_ALIAS: 2}
+    assert ml_model.load_model(tmp_path)[1]["format"] == "json"
+    # The artifact is written under its final extension, so it really is JSON
+    json.loads((registry.version_dir(ml_model.MODEL_NAME, 1) / "model.json").read_text())
+    with pytest.raises(ValueError):
+        ml_model.retrain_and_save(tmp_path, fmt="bin")
+    assert registry.versions(ml_model.MODEL_NAME) == [1, 2]
+    assert ml_model.load_model(tmp_path, alias=SHADOW_ALIAS)[1]["version"] == 2
+
+    meta_path = registry.version_dir(ml_model.MODEL_NAME, 1) / "meta.json"
+    stale = json.loads(meta_path.read_text())
+    stale["feature_schema_hash"] = "0" * 16
+    meta_path.write_text(json.dumps(stale))
+    with pytest.raises(ValueError):
+        ml_model.load_model(tmp_path)
+
+
+def test_batched_probabilities_match_per_row_scoring():
+    import pandas as pd
+
+    model = ml_model.train_model()
+    batch = [
+        {"error_rate": 0.4, "latency": 3000, "cpu_usage": 95, "downstream_failures": 3, "impact_score": 0.5},
+        {"error_rate": 2.0, "latency": -5, "cpu_usage": 250, "downstream_failures": 40},
+        {},
+    ]
+    probs = ml_model.predict_service_probabilities(batch)
+    assert probs.shape == (3,)
+    assert ml_model.feature_matrix(batch)[1].tolist() == [1.0, 0.0, 100.0, 10.0, 0.0]
+
+    for features, prob in zip(batch, probs):
+        capped = {
+            column: min(upper, max(lower, float(features.get(column, 0))))
+            for column, lower, upper in zip(ml_model.FEATURE_COLUMNS, ml_model.FEATURE_LOWER, ml_model.FEATURE_UPPER)
+        }
+        expected = model.predict_proba(pd.DataFrame([capped])[ml_model.FEATURE_COLUMNS])[0][1]
+        assert abs(prob - expected) < 1e-6
+        assert ml_model.predict_service_probability(features) == pytest.approx(prob)
+    assert ml_model.predict_service_probabilities([]).shape == (0,)
+
+
+def test_feature_buffer_is_reused_and_grows():
+    from app.engines.inference import FeatureBuffer
+
+    buffer = FeatureBuffer(capacity=2)
+    first = buffer.fill([{"latency": 9000}])
+    assert first.tolist() == [[0.0, 5000.0, 0.0, 0.0, 0.0]]
+    assert np.shares_memory(first, buffer.fill([{}, {}]))
+
+    grown = buffer.fill([{"error_rate": 0.5}] * 5)
+    assert buffer.capacity >= 5 and grown.shape == (5, len(ml_model.FEATURE_COLUMNS))
+    assert not np.shares_memory(first, grown)
+
+
+def test_numpy_tree_backend_matches_xgboost(monkeypatch):
+    from app.engines.tree_inference import CompiledTrees
+
+    model = ml_model.train_model()
+    trees = CompiledTrees.from_booster(model.get_booster())
+    assert len(trees) == 100
+
+    rng = np.random.default_rng(3)
+    X = rng.uniform(ml_model.FEATURE_LOWER, ml_model.FEATURE_UPPER, size=(2000, len(ml_model.FEATURE_COLUMNS)))
+    X[::7, 1] = np.nan
+    expected = model.get_booster().inplace_predict(X)
+    assert np.allclose(trees.predict_proba(X), expected, atol=1e-6)
+
+    batch = [dict(zip(ml_model.FEATURE_COLUMNS, row)) for row in X[1:9].tolist()]
+    monkeypatch.setattr(ml_model, "INFERENCE_BACKEND", "numpy")
+    assert np.allclose(ml_model.predict_service_probabilities(batch), expected[1:9], atol=1e-6)
+    assert ml_model.current_model().trees is ml_model.current_model().trees
+
+
+def test_background_retrain_swaps_model_atomically(model_dir, monkeypatch):
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from app.engines import retraining
+
+    monkeypatch.setattr(ml_model, "_serving", None)
+    model, meta = ml_model.load_model(model_dir)
+    old = ml_model.install_model(model, meta)
+
+    release = threading.Event()
+    fit_model = ml_model.fit_model
+    monkeypatch.setattr(ml_model, "fit_model", lambda callbacks: release.wait(5) and fit_model(callbacks))
+
+    manager = retraining.RetrainManager(executor=ThreadPoolExecutor(max_workers=1), directory=model_dir)
+    job = manager.submit()
+    assert manager.submit() is job
+    assert job.status == retraining.RUNNING and job.to_json()["rounds_completed"] == 0
+    assert ml_model.current_model() is old
+    assert ml_model.predict_service_probabilities([{"error_rate": 0.9}]).shape == (1,)
+
+    release.set()
+    assert manager.wait(job, timeout=30)
+    assert job.status == retraining.SUCCEEDED, job.error
+    assert job.model_version == old.version + 1 == ml_model.model_version()
+    # Every boosting round was relayed by the worker's callback
+    assert job.rounds_completed == job.total_rounds == ml_model.TRAINING_ROUNDS
+    assert manager.get(job.id).to_json()["model_version"] == job.model_version
+
+
+def test_retrain_recovers_from_a_dead_worker_pool(model_dir, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    from concurrent.futures.process import BrokenProcessPool
+    from app.engines import retraining
+
+    class DeadPool:
+        def submit(self, *args):
+            raise BrokenProcessPool("worker killed")
+
+        def shutdown(self, wait=True):
+            pass
+
+    monkeypatch.setattr(ml_model, "_serving", None)
+    ml_model.install_model(*ml_model.load_model(model_dir))
+    monkeypatch.setattr(retraining, "_default_executor", lambda: ThreadPoolExecutor(max_workers=1))
+    manager = retraining.RetrainManager(executor=DeadPool(), directory=model_dir)
+    job = manager.submit()
+    assert manager.wait(job, timeout=30) and job.status == retraining.SUCCEEDED, job.error
+
+    class FailingPool(DeadPool):
+        def submit(self, *args):
+            raise RuntimeError("cannot schedule new futures after shutdown")
+
+    manager = retraining.RetrainManager(executor=FailingPool(), directory=model_dir)
+    with pytest.raises(RuntimeError):
+        manager.submit()
+    # The failed submission never became the active job
+    assert manager._active is None and manager.get(job.id) is None
+
+
+def test_shadow_model_is_scored_off_the_response_path(model_dir, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    from app.engines.shadow_scoring import ShadowScorer
+
+    model, meta = ml_model.load_model(model_dir)
+    monkeypatch.setattr(ml_model, "_serving", ml_model.ServingModel(model, meta))
+    monkeypatch.setattr(ml_model, "shadow_scorer", ShadowScorer(executor=ThreadPoolExecutor(max_workers=1)))
+    monkeypatch.setattr(ml_model, "_shadow", None)
+    ml_model.install_shadow(model, {**meta, "version": 99})
+
+    batch = [{"error_rate": 0.9, "impact_score": 0.8}, {"error_rate": 0.01}]
+    probs = ml_model.predict_service_probabilities(batch, services=["database", "frontend"])
+    ml_model.shadow_scorer._executor.shutdown(wait=True)
+
+    stats = ml_model.shadow_scorer.stats()
+    assert stats["batches"] == 1 and stats["rows"] == 2 and stats["errors"] == 0
+    assert stats["max_abs_diff"] < 1e-6 and stats["top_suspect_agreement"] == 1.0
+    entry = stats["recent"][0]
+    assert entry["services"] == ["database", "frontend"] and entry["shadow_version"] == 99
+    assert np.allclose(entry["primary"], probs, atol=1e-4)
+
+
+def test_out_of_core_training_from_shards_with_continuation(tmp_path):
+    from app.engines.shard_training import LABEL_COLUMN, TRAINING_ROUNDS, train_from_shards
+
+    X, y = ml_model._synthetic_training_data(n_samples=3000, seed=5)
+    shards = tmp_path / "history"
+    shards.mkdir()
+    np.savez(shards / "2026-01.npz", X=X[:1000].to_numpy(), y=y[:1000].to_numpy())
+    columns = {column: X[column].to_numpy()[1000:2000] for column in ml_model.FEATURE_COLUMNS}
+    np.savez(shards / "2026-02.npz", **columns, **{LABEL_COLUMN: y.to_numpy()[1000:2000]})
+    X[2000:].assign(**{LABEL_COLUMN: y[2000:]}).to_csv(shards / "2026-03.csv", index=False)
+
+    model, summary = train_from_shards([shards], num_boost_round=20, batch_rows=256)
+    assert summary["shards"] == 3 and summary["rows"] == 3000 and summary["rounds"] == 20
+    accuracy = ((model.predict_proba(X.to_numpy())[:, 1] > 0.5) == y.to_numpy()).mean()
+    assert accuracy > 0.95
+
+    registry_dir = tmp_path / "models"
+    ml_model.retrain_and_save(registry_dir, shards=[shards])
+    model, meta = ml_model.retrain_and_save(registry_dir, shards=[shards], continue_training=True)
+    assert meta["training"]["continued_from"] == 1
+    assert model.get_booster().num_boosted_rounds() == meta["training"]["rounds"] == 2 * TRAINING_ROUNDS
+
+
+def test_prediction_cache_skips_inference_for_repeated_rows(model_dir, monkeypatch):
+    from app.engines.prediction_cache import PredictionCache
+
+    model, meta = ml_model.load_model(model_dir)
+    monkeypatch.setattr(ml_model, "_serving", None)
+    monkeypatch.setattr(ml_model, "prediction_cache", PredictionCache(max_entries=3))
+    ml_model.install_model(model, meta)
+
+    scored = []
+    score = ml_model._score
+    monkeypatch.setattr(ml_model, "_score", lambda serving, X: scored.append(len(X)) or score(serving, X))
+
+    batch = [{"error_rate": 0.9}, {"error_rate": 0.01}]
+    first = ml_model.predict_service_probabilities(batch)
+    again = ml_model.predict_service_probabilities([{"error_rate": 0.9 + 1e-9}, *batch, {"latency": 900}])
+    assert scored == [2, 1]
+    assert np.allclose(again[:3], [first[0], *first])
+    stats = ml_model.prediction_cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (3, 3, 3)
+
+    ml_model.install_model(model, meta)
+    ml_model.predict_service_probabilities(batch)
+    assert scored == [2, 1, 2]
+
+    expiring = PredictionCache(ttl_seconds=-1)
+    keys = expiring.keys(1, ml_model.feature_matrix(batch))
+    expiring.store(keys, [0.5, 0.5])
+    assert expiring.lookup(keys)[1] == [0, 1] and expiring.expirations == 2
+
+
+def test_sharded_scoring_matches_single_call_and_autotunes(monkeypatch):
+    from app.engines.sharded_inference import InferenceConfig, ShardedScorer, candidate_configs
+
+    booster = ml_model.train_model().get_booster()
+    X = np.random.default_rng(4).uniform(
+        ml_model.FEATURE_LOWER, ml_model.FEATURE_UPPER, size=(10000, len(ml_model.FEATURE_COLUMNS))
+    )
+    scorer = ShardedScorer(InferenceConfig(nthread=1, shard_rows=1500, workers=4), min_rows=0)
+    assert np.array_equal(scorer.score(booster, X), booster.inplace_predict(X))
+
+    # Concurrent calls that resize the pool share it without losing shards
+    from concurrent.futures import ThreadPoolExecutor
+    configs = [InferenceConfig(nthread=1, shard_rows=1000, workers=w) for w in (2, 3, 4, 5, 6, 7)]
+    with ThreadPoolExecutor(max_workers=6) as callers:
+        results = list(callers.map(lambda config: scorer.score(booster, X, config), configs * 3))
+    assert all(np.array_equal(result, results[0]) for result in results)
+    assert scorer._executor_workers == 7
+
+    assert {(c.nthread, c.workers) for c in candidate_configs(4)} >= {(1, 1), (4, 1), (1, 4), (2, 2)}
+    config = scorer.autotune(booster, rows=4000, repeats=1, candidates=candidate_configs(2))
+    assert config is scorer.config and config.seconds > 0
+    assert scorer.small_config.shard_rows == 0 and scorer.small_config.seconds > 0
+    scorer.min_rows = 4096
+    assert scorer.config_for(3) is scorer.small_config and scorer.config_for(len(X)) is config
+
+    # Request-sized batches score on the serving model's small-batch booster
+    monkeypatch.setattr(ml_model, "sharded_scorer", ShardedScorer(
+        InferenceConfig(nthread=2), small_config=InferenceConfig(nthread=1)
+    ))
+    serving = ml_model.ServingModel(ml_model.train_model())
+    assert serving.small_booster is not serving.booster
+    assert int(json.loads(serving.small_booster.save_config())["learner"]["generic_param"]["nthread"]) == 1
+    assert np.array_equal(ml_model._score(serving, X[:3]), booster.inplace_predict(X[:3]))
+
+    services = [f"svc-{i}" for i in range(len(X))]
+    ranking = ml_model.rank_service_probabilities(X, services, top_k=5)
+    full = ml_model.rank_service_probabilities(X, services)
+    assert [p for _, p in ranking] == [p for _, p in full[:5]]
+    assert [p for _, p in full] == sorted((p for _, p in full), reverse=True)
+
+
+def test_onnx_backend_is_parity_checked_at_load(model_dir, monkeypatch, tmp_path):
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("onnxmltools")
+    from app.engines import onnx_backend
+
+    model, meta = ml_model.load_model(model_dir)
+    monkeypatch.setattr(ml_model, "INFERENCE_BACKEND", "onnx")
+    serving = ml_model.ServingModel(model, meta)
+    assert serving.onnx is not None and serving.onnx.parity_error < onnx_backend.ONNX_PARITY_ATOL
+
+    X = ml_model.feature_matrix([{"error_rate": 0.3, "latency": 2500, "impact_score": 0.2}, {}])
+    assert np.allclose(ml_model._score(serving, X), serving.booster.inplace_predict(X), atol=1e-6)
+
+    onnx_backend.export_onnx(model, tmp_path / "model.onnx")
+    assert (tmp_path / "model.onnx").stat().st_size > 0
+
+    monkeypatch.setattr(onnx_backend, "parity_error", lambda scorer, booster: 1.0)
+    assert ml_model.ServingModel(model, meta).onnx is None
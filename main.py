@@ -1,13 +1,25 @@
+from contextlib import asynccontextmanager
 from pathlib import Path
 
-from fastapi import FastAPI
-from fastapi.responses import FileResponse
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import FileResponse, JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.engines.graph_engine import build_graph, graph_to_json
-from app.routes.incident import router as incident_router
+from app.engines.environments import EnvironmentState
+from app.engines.graph_engine import GraphEngine
+from app.engines.graph_query import query_graph
+from app.engines.ml_model import AUTOTUNE_INFERENCE, autotune_inference, load_serving_model
+from app.routes.incident import get_environment, router as incident_router
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the persisted root-cause model before the first request arrives
+    load_serving_model()
+    if AUTOTUNE_INFERENCE:
+        autotune_inference()
+    yield
+
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(incident_router)
 
@@ -25,11 +37,53 @@ app.add_middleware(
 
 BASE_DIR = Path(__file__).resolve().parent
 
+def _etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
 # ✅ JSON API
 @app.get("/incident/graph")
-def get_graph():
-    G = build_graph()
-    return graph_to_json(G)
+def get_graph(
+    request: Request,
+    since: int | None = None,
+    service: str | None = None,
+    hops: int = Query(1, ge=0),
+    direction: str = Query("both", pattern="^(upstream|downstream|both)$"),
+    min_impact: float | None = None,
+    cursor: int | None = None,
+    limit: int | None = Query(None, ge=1),
+    env: EnvironmentState = Depends(get_environment),
+):
+    """
+    Current dependency graph. Responses carry an ETag (304 when unchanged);
+    `?since=<version>` returns only the nodes changed after that version.
+
+    `service`/`hops`/`direction` scope the result to a k-hop neighborhood,
+    `min_impact` drops low-impact services and `cursor`/`limit` paginate.
+    """
+    snapshot = GraphEngine(env).snapshot()
+    # Each filtered or delta view of a version is a different representation
+    neighborhood = {"hops": hops, "direction": direction} if service is not None else {}
+    etag = snapshot.etag_for(
+        since=since, service=service, min_impact=min_impact, cursor=cursor, limit=limit, **neighborhood
+    )
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    if service is None and min_impact is None and cursor is None and limit is None:
+        return JSONResponse(snapshot.to_json(since), headers=headers)
+    try:
+        payload = query_graph(
+            snapshot, service, hops, direction, min_impact, since, cursor, limit
+        )
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Service not found")
+    return JSONResponse(payload, headers=headers)
 
 @app.get("/graph")
 def serve_graph():